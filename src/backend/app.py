@@ -1,63 +1,325 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
 import json
-from datetime import datetime
+import base64
+import binascii
+from datetime import datetime, date
 import traceback
 from bson.objectid import ObjectId
-from pymongo import MongoClient
-from main import main
+from bson.errors import InvalidId
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+from image_processor import decode_image
+from jobs import submit_job, track_job, job_status
+from ocr_pool import ocr_pool, PoolBusy
+from scan_cache import scan_cache
+from scans import get_scan
+from ttl_cache import TTLCache, VersionTable
+from write_behind import WriteBehind
+from model import execute_model
+import metrics
+from db import user_profiles_collection, history_collection, ensure_indexes, check_query_plans
 
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Scan-Id', 'Retry-After', 'Server-Timing'])
 
-UPLOAD_FOLDER = './src/backend/uploads'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# A batch is admitted whole, so it can never be larger than the OCR pool's running plus queued slots
+BATCH_MAX_IMAGES = int(os.environ.get('BATCH_MAX_IMAGES', 20))
+if BATCH_MAX_IMAGES > ocr_pool.capacity:
+    raise RuntimeError(f"BATCH_MAX_IMAGES={BATCH_MAX_IMAGES} does not fit in the OCR pool's {ocr_pool.capacity} slots; "
+                       f"raise OCR_QUEUE_SIZE or lower BATCH_MAX_IMAGES")
+# Add a Server-Timing header with the scan's stage timings to every upload response (or per request with ?timing=1)
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
 
-MONGODB_URI = os.environ.get("MONGODB_URI")
-client = MongoClient(MONGODB_URI)
-db = client['nutrilens']
-user_profiles_collection = db['userprofiles']
-history_collection = db['history']
+# History paging: the largest page a client may ask for, and how many entries Mongo returns per round trip when streaming
+HISTORY_MAX_PAGE_SIZE = int(os.environ.get('HISTORY_MAX_PAGE_SIZE', 200))
+HISTORY_STREAM_BATCH_SIZE = int(os.environ.get('HISTORY_STREAM_BATCH_SIZE', 500))
+HISTORY_FIELDS = ("userId", "date", "name", "final_rating", "calories")
+
+# Profiles change rarely, so uploads reuse the profile and its resolved choice for a few minutes
+PROFILE_CACHE_SIZE = int(os.environ.get('PROFILE_CACHE_SIZE', 10000))
+PROFILE_CACHE_TTL = int(os.environ.get('PROFILE_CACHE_TTL', 300))
+profile_cache = TTLCache(PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL)
+# Bumped by /user-profile/<id>/invalidate. It lives in shared memory, so under the pre-forking launcher an
+# invalidation reaches every worker's cache; across hosts the TTL still bounds how stale a profile can get
+profile_versions = VersionTable()
+
+# History saves: bulk request cap, and write-behind mode (acknowledge first, insert in batches) for single saves
+HISTORY_BULK_MAX_ENTRIES = int(os.environ.get('HISTORY_BULK_MAX_ENTRIES', 500))
+HISTORY_WRITE_BEHIND = os.environ.get('HISTORY_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes')
+HISTORY_WRITE_BATCH_SIZE = int(os.environ.get('HISTORY_WRITE_BATCH_SIZE', 100))
+HISTORY_WRITE_FLUSH_SECONDS = float(os.environ.get('HISTORY_WRITE_FLUSH_SECONDS', 1))
+# Queued saves were already acknowledged, so a failed batch is retried this many times (one flush interval apart)
+# and entries that still cannot be saved are appended to the dead-letter file as JSON lines for replay
+HISTORY_WRITE_RETRIES = int(os.environ.get('HISTORY_WRITE_RETRIES', 10))
+HISTORY_DEAD_LETTER_FILE = os.environ.get('HISTORY_DEAD_LETTER_FILE', 'history-dead-letter.jsonl')
+
+def already_saved(write_error):
+    # Ids are assigned in build_history_entry, so a duplicate _id is the same entry from an earlier, partly written attempt
+    return write_error.get("code") == 11000 and write_error.get("keyPattern", {"_id": 1}) == {"_id": 1}
+
+def insert_history_entries(entries):
+    """Insert entries unordered, so one bad document does not stop the rest. Returns {index: error}.
+    Entries already stored by an earlier attempt count as saved, so a retried batch can be inserted again."""
+    try:
+        history_collection.insert_many(entries, ordered=False)
+        return {}
+    except BulkWriteError as bwe:
+        return {error["index"]: error.get("errmsg", "Write failed") for error in bwe.details.get("writeErrors", [])
+                if not already_saved(error)}
+
+def dead_letter_history_entries(entries, error):
+    """Append entries that could not be saved to HISTORY_DEAD_LETTER_FILE, one JSON object per line."""
+    with open(HISTORY_DEAD_LETTER_FILE, 'a', encoding='utf-8') as file:
+        file.write(''.join(json.dumps({"entry": entry, "error": error}, default=str) + '\n' for entry in entries))
+    print(f"history-writer: {len(entries)} entries were not saved and went to {HISTORY_DEAD_LETTER_FILE}: {error}")
+
+def flush_history_entries(entries):
+    # Errors for the whole batch (e.g. the database is unreachable) raise and are retried by the writer;
+    # per-entry write errors would fail again, so those entries go straight to the dead-letter file
+    failed = insert_history_entries(entries)
+    for index, error in failed.items():
+        dead_letter_history_entries([entries[index]], error)
+
+history_writer = WriteBehind(flush_history_entries, HISTORY_WRITE_BATCH_SIZE, HISTORY_WRITE_FLUSH_SECONDS,
+                             name='history-writer', max_retries=HISTORY_WRITE_RETRIES,
+                             on_failure=dead_letter_history_entries)
+
+def build_history_entry(data):
+    """Build a history document from a request item. Clients syncing offline scans may send the scan's own date.
+    Raises ValueError when the item is not an object or a field is missing or has the wrong type."""
+    if not isinstance(data, dict):
+        raise ValueError("A history entry must be a JSON object")
+    missing = [field for field in ("userId", "name", "final_rating", "calories") if field not in data]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+    if not isinstance(data["userId"], str) or not isinstance(data["name"], str):
+        raise ValueError("'userId' and 'name' must be strings")
+    for field in ("final_rating", "calories"):
+        value = data[field]
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise ValueError(f"'{field}' must be a number")
+    return {
+        # Assigned here so write-behind and bulk saves can return the id before the insert happens
+        "_id": ObjectId(),
+        "userId": data["userId"],
+        "date": parse_history_date(data.get("date"), 'date') or datetime.utcnow().strftime('%Y-%m-%d'),
+        "name": data["name"],
+        "final_rating" :data["final_rating"],
+        "calories": data["calories"]
+    }
 
 @app.route('/save-history', methods=['POST'])
 def save_history():
     try:
         data = request.json
-        history_entry = {
-            "userId": data["userId"],
-            "date": datetime.utcnow().strftime('%Y-%m-%d'),
-            "name": data["name"],
-            "final_rating" :data["final_rating"],
-            "calories": data["calories"]
-        }
+        history_entry = build_history_entry(data)
+        if HISTORY_WRITE_BEHIND or flag_set(request.args.get('async', '')):
+            history_writer.put(history_entry)
+            return jsonify({"message": "History entry queued", "id": str(history_entry["_id"])}), 202
         history_collection.insert_one(history_entry)
-        return jsonify({"message": "History entry saved successfully"}), 201
+        return jsonify({"message": "History entry saved successfully", "id": str(history_entry["_id"])}), 201
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
     except Exception as e:
         print(f"Error details: {str(e)}")
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+@app.route('/save-history/bulk', methods=['POST'])
+def save_history_bulk():
+    """Save a JSON array of history entries (same fields as /save-history) in one insert_many.
+    Returns one {index, status, id, error} item per entry; status is 'saved' or 'failed'."""
+    try:
+        data = request.json
+        if not isinstance(data, list) or not data:
+            return jsonify({"error": "Send a non-empty array of history entries"}), 400
+        if len(data) > HISTORY_BULK_MAX_ENTRIES:
+            return jsonify({"error": f"At most {HISTORY_BULK_MAX_ENTRIES} entries per request"}), 400
+
+        results = []
+        entries = []
+        for index, item in enumerate(data):
+            try:
+                entry = build_history_entry(item)
+                entries.append(entry)
+                results.append({"index": index, "status": "saved", "id": str(entry["_id"])})
+            except ValueError as ve:
+                results.append({"index": index, "status": "failed", "error": str(ve)})
+
+        if entries:
+            failed = insert_history_entries(entries)
+            saved = [result for result in results if result["status"] == "saved"]
+            for entry_index, error in failed.items():
+                saved[entry_index].update({"status": "failed", "error": error, "id": None})
+        return jsonify(results), 200
+    except Exception as e:
+        print(f"Error saving history batch: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+def encode_history_cursor(entry_id):
+    return base64.urlsafe_b64encode(entry_id.binary).decode('ascii')
+
+def decode_history_cursor(cursor):
+    """Turn an opaque nextCursor back into the _id it points past. Raises ValueError."""
+    try:
+        return ObjectId(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (binascii.Error, InvalidId, UnicodeEncodeError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def parse_history_date(value, name):
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"'{name}' must be a date in YYYY-MM-DD format")
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"'{name}' must be a date in YYYY-MM-DD format")
+
+def history_query(userId, args):
+    """Build the find filter from the from/to query parameters (inclusive, YYYY-MM-DD)."""
+    query = {"userId": userId}
+    date_range = {}
+    date_from = parse_history_date(args.get('from'), 'from')
+    date_to = parse_history_date(args.get('to'), 'to')
+    if date_from:
+        date_range["$gte"] = date_from
+    if date_to:
+        date_range["$lte"] = date_to
+    if date_range:
+        query["date"] = date_range
+    return query
+
+def history_projection(args):
+    """Project only the requested ?fields= (comma separated), or every history field."""
+    fields = args.get('fields')
+    if not fields:
+        return {field: 1 for field in HISTORY_FIELDS}
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in requested if field not in HISTORY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return {field: 1 for field in requested}
+
+def history_chunk(entry, index):
+    """One entry of a streamed history array, led by a comma unless it is the first."""
+    entry["_id"] = str(entry["_id"])
+    return (',' if index else '') + json.dumps(entry, default=str)
+
+def stream_history(cursor):
+    """Yield the entries as one JSON array, pulling them from Mongo a batch at a time."""
+    yield '['
+    for index, entry in enumerate(cursor):
+        yield history_chunk(entry, index)
+    yield ']'
+
+def parse_history_request(userId, args):
+    """Validate the /get-history query parameters. Returns (query, projection, limit); raises ValueError."""
+    query = history_query(userId, args)
+    projection = history_projection(args)
+    limit = args.get('limit')
+    cursor = args.get('cursor')
+    if limit is not None:
+        limit = int(limit) if limit.isdigit() else 0
+        if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+            raise ValueError(f"'limit' must be between 1 and {HISTORY_MAX_PAGE_SIZE}")
+    if cursor:
+        if limit is None:
+            raise ValueError("'cursor' requires 'limit'")
+        query["_id"] = {"$gt": decode_history_cursor(cursor)}
+    return query, projection, limit
+
+def history_page(entries, limit):
+    """Turn up to limit + 1 fetched entries into the {items, nextCursor} page body."""
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_history_cursor(entries[-1]["_id"])
+    for entry in entries:
+        entry["_id"] = str(entry["_id"])
+    return {"items": entries, "nextCursor": next_cursor}
+
 @app.route('/get-history/<userId>', methods=['GET'])
 def get_history(userId):
     try:
-        entries = list(history_collection.find({"userId": userId}, {"_id": 0}))
-        if not entries:
-            return jsonify([]), 200
-        return jsonify(entries), 200
+        try:
+            query, projection, limit = parse_history_request(userId, request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Without a limit, stream the whole history as a plain array so memory stays flat
+        if limit is None:
+            entries = history_collection.find(query, projection).sort("_id", ASCENDING) \
+                .batch_size(HISTORY_STREAM_BATCH_SIZE)
+            return Response(stream_with_context(stream_history(entries)), mimetype='application/json')
+
+        # One page, oldest first; fetching one extra entry tells us whether there is another page
+        entries = list(history_collection.find(query, projection).sort("_id", ASCENDING).limit(limit + 1))
+        return jsonify(history_page(entries, limit)), 200
     except Exception as e:
         print(f"Error fetching history for user {userId}: {str(e)}")
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+@app.route('/history-summary/<userId>', methods=['GET'])
+def get_history_summary(userId):
+    """Per-day or per-ISO-week calorie totals and averages, aggregated in Mongo.
+    Query parameters: period=day|week (default day) and the same from/to filters as /get-history."""
+    try:
+        try:
+            query = history_query(userId, request.args)
+            period = request.args.get('period', 'day')
+            if period not in ('day', 'week'):
+                raise ValueError("'period' must be 'day' or 'week'")
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if period == 'day':
+            group_key = "$date"
+            sort = {"_id": 1}
+        else:
+            entry_date = {"$dateFromString": {"dateString": "$date", "format": "%Y-%m-%d"}}
+            group_key = {"year": {"$isoWeekYear": entry_date}, "week": {"$isoWeek": entry_date}}
+            sort = {"_id.year": 1, "_id.week": 1}
+
+        pipeline = [
+            {"$match": query},
+            {"$group": {
+                "_id": group_key,
+                "count": {"$sum": 1},
+                "totalCalories": {"$sum": "$calories"},
+                "averageCalories": {"$avg": "$calories"},
+                "averageRating": {"$avg": "$final_rating"},
+            }},
+            {"$sort": sort},
+        ]
+
+        summary = []
+        for row in history_collection.aggregate(pipeline):
+            key = row.pop("_id")
+            if period == 'day':
+                row["period"] = key
+                row["startDate"] = key
+            else:
+                row["period"] = f"{key['year']}-W{key['week']:02d}"
+                row["startDate"] = date.fromisocalendar(key['year'], key['week'], 1).isoformat()
+            summary.append(row)
+        return jsonify(summary), 200
+    except Exception as e:
+        print(f"Error summarising history for user {userId}: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/user-profile/<userId>', methods=['GET'])
 def get_user_profile(userId):
     try:
-        user_profile = user_profiles_collection.find_one({"clerkId": userId}, {"_id": 0})
+        user_profile, _ = load_profile(userId)
         if not user_profile:
             return jsonify({"error": "User profile not found"}), 404
         return jsonify(user_profile), 200
@@ -65,19 +327,34 @@ def get_user_profile(userId):
         print(f"Error fetching user profile: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/user-profile/<userId>/invalidate', methods=['POST'])
+def invalidate_user_profile(userId):
+    """Drop the cached profile in every worker so the next request reads it from Mongo. Call after updating a profile."""
+    profile_versions.bump(userId)
+    invalidated = profile_cache.pop(userId) is not None
+    return jsonify({"invalidated": invalidated}), 200
+
 @app.route('/delete-entry', methods=['POST'])
 def delete_entry():
     try:
         data = request.json
         user_id = data["userId"]
-        entry_id = data["entryId"]
-        date, name = entry_id.split(' ', 1)
-        
-        result = history_collection.delete_one({
-            "userId": user_id,
-            "date": date,
-            "name": name
-        })
+        if data.get("id"):
+            # Delete by primary key; scoped to the user so one user cannot delete another's entries
+            try:
+                result = history_collection.delete_one({"_id": ObjectId(data["id"]), "userId": user_id})
+            except (InvalidId, TypeError):
+                return jsonify({"error": "Invalid entry id"}), 400
+        else:
+            # Older clients identify the entry as "<date> <name>"
+            entry_id = data["entryId"]
+            date, name = entry_id.split(' ', 1)
+            
+            result = history_collection.delete_one({
+                "userId": user_id,
+                "date": date,
+                "name": name
+            })
         
         if result.deleted_count == 0:
             return jsonify({"error": "Entry not found"}), 404
@@ -88,38 +365,326 @@ def delete_entry():
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+@app.route('/delete-entries', methods=['POST'])
+def delete_entries():
+    """Delete many of a user's entries in one delete_many, either by {"ids": [...]}
+    or by a {"from", "to"} date range (inclusive, YYYY-MM-DD)."""
+    try:
+        data = request.json or {}
+        user_id = data.get("userId")
+        if not user_id:
+            return jsonify({"error": "User ID is required"}), 400
+        
+        ids = data.get("ids")
+        has_range = bool(data.get("from") or data.get("to"))
+        if bool(ids) == has_range:
+            return jsonify({"error": "Send either a non-empty 'ids' list or a 'from'/'to' date range"}), 400
+        
+        query = {"userId": user_id}
+        if ids:
+            if not isinstance(ids, list) or len(ids) > HISTORY_BULK_MAX_ENTRIES:
+                return jsonify({"error": f"'ids' must be a list of at most {HISTORY_BULK_MAX_ENTRIES} ids"}), 400
+            try:
+                query["_id"] = {"$in": [ObjectId(entry_id) for entry_id in ids]}
+            except (InvalidId, TypeError):
+                return jsonify({"error": "Invalid entry id"}), 400
+        else:
+            try:
+                date_range = {}
+                if data.get("from"):
+                    date_range["$gte"] = parse_history_date(data["from"], 'from')
+                if data.get("to"):
+                    date_range["$lte"] = parse_history_date(data["to"], 'to')
+            except ValueError as ve:
+                return jsonify({"error": str(ve)}), 400
+            query["date"] = date_range
+        
+        result = history_collection.delete_many(query)
+        return jsonify({"deletedCount": result.deleted_count}), 200
+    except Exception as e:
+        print(f"Error deleting entries: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/cache-stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({"scanCache": scan_cache.stats(), "profileCache": profile_cache.stats()}), 200
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE_LATEST)
+
 @app.route('/health', methods=['GET'])
 def get_res():
     print("Health check received")
     return jsonify({"msg": "Server is healthy"})
 
+@app.route('/ready', methods=['GET'])
+def get_ready():
+    """Readiness probe: 200 once this process's OCR workers have warmed up, 503 until then."""
+    if ocr_pool.ready():
+        return jsonify({"ready": True, "pid": os.getpid()}), 200
+    return jsonify({"ready": False, "pid": os.getpid()}), 503
+
+# Request parsing shared with the async app in asgi.py: these take the form, files and query
+# arguments instead of reading the request, and raise ValueError for a 400 response
+def busy_response(busy):
+    """A 503 with Retry-After. The plain dict body works as a return value in both apps."""
+    return {"error": str(busy), "retryAfter": busy.retry_after}, 503, {'Retry-After': str(busy.retry_after)}
+
+def flag_set(value):
+    return str(value).lower() in ('1', 'true', 'yes')
+
+def debug_requested(form, args):
+    return flag_set(form.get('debug', args.get('debug', '')))
+
+def timing_requested(args):
+    return SERVER_TIMING or flag_set(args.get('timing', ''))
+
+def parse_weight(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError("'weight' must be a whole number")
+
+def upload_fields(form, files):
+    """Validate an upload form. Returns (user_id, weight, image file)."""
+    weight = form.get('weight')
+    image = files.get('image')
+    user_id = form.get('userId')
+    
+    if not weight or not image:
+        raise ValueError("Missing required fields")
+    
+    if not user_id:
+        raise ValueError("User ID is required")
+    
+    return user_id, parse_weight(weight), image
+
+def batch_fields(form, files):
+    """Validate a batch upload form: repeated 'image' fields with matching 'weight' fields, or a
+    single 'weight' for all of them. Returns (user_id, [(image file, weight), ...])."""
+    images = files.getlist('image')
+    weights = form.getlist('weight')
+    user_id = form.get('userId')
+    
+    if not images or not weights:
+        raise ValueError("Missing required fields")
+    
+    if len(weights) == 1:
+        weights = weights * len(images)
+    if len(weights) != len(images):
+        raise ValueError("Send one weight per image or a single weight for all")
+    
+    if len(images) > BATCH_MAX_IMAGES:
+        raise ValueError(f"At most {BATCH_MAX_IMAGES} images per batch")
+    
+    if not user_id:
+        raise ValueError("User ID is required")
+    
+    return user_id, [(image, parse_weight(weight)) for image, weight in zip(images, weights)]
+
+def submit_batch(user_id, choice, uploads, debug):
+    """Decode and queue a batch as one unit. Returns one item per image, in order: a failed
+    item for images that do not decode and an item holding the 'job' for the rest.
+    Waits for the OCR pool to have room for all of them; raises PoolBusy, without queueing anything, if it does not in time."""
+    items = []
+    decoded = []
+    for index, (image, weight) in enumerate(uploads):
+        timings = {}
+        try:
+            decoded.append((index, weight, decode_image(image.read(), timings), timings))
+        except ValueError as ve:
+            items.append({"index": index, "status": "failed", "error": str(ve)})
+    
+    # Admit the whole batch or none of it, so an idle server never turns half a batch away
+    ocr_pool.reserve(len(decoded))
+    unsubmitted = len(decoded)
+    try:
+        # Submit every image before waiting so the OCR workers process the batch in parallel
+        for index, weight, image_array, timings in decoded:
+            unsubmitted -= 1
+            job = submit_job(user_id, choice, weight, image_array, debug, reserved=True, timings=timings)
+            items.append({"index": index, "job": job})
+    finally:
+        ocr_pool.release(unsubmitted)
+    items.sort(key=lambda item: item["index"])
+    return items
+
+def batch_result(item):
+    """The response entry for a submit_batch item, once its job (if any) has finished."""
+    job = item.pop("job", None)
+    if job is not None:
+        item.update({"status": job.status, "result": job.result, "error": job.error, "scanId": job.scan_id})
+    return item
+
+def scan_headers(job, args):
+    headers = {}
+    if job.scan_id:
+        headers['X-Scan-Id'] = job.scan_id
+    if timing_requested(args):
+        headers['Server-Timing'] = metrics.server_timing(job.timings)
+    return headers
+
+def cached_profile(user_id):
+    """(profile, choice) from the cache, or None when it is missing or was invalidated since it was cached."""
+    entry = profile_cache.get(user_id)
+    if entry is None or entry[2] != profile_versions.get(user_id):
+        return None
+    return entry[:2]
+
+def cache_profile(user_id, user_profile, version):
+    """Cache a profile read from Mongo with its resolved choice. version is profile_versions.get(user_id)
+    from before the read, so an invalidation that races the read is not lost. Returns (profile, choice),
+    or (None, None) without caching anything, so a profile created right after sign-up is picked up immediately."""
+    if not user_profile:
+        return None, None
+    entry = (user_profile, determine_choice(user_profile))
+    profile_cache.set(user_id, entry + (version,))
+    return entry
+
+def load_profile(user_id):
+    """Return (profile, choice) for the user, from the cache when possible. (None, None) if there is no profile."""
+    entry = cached_profile(user_id)
+    if entry is None:
+        version = profile_versions.get(user_id)
+        entry = cache_profile(user_id, user_profiles_collection.find_one({'clerkId': user_id}, {'_id': 0}), version)
+    return entry
+
+def resolve_choice(user_id):
+    """Return the user's RDA profile choice, or None if there is no profile."""
+    return load_profile(user_id)[1]
+
+def parse_upload_request():
+    """Validate an upload form and build the submit_job keyword arguments. Returns (kwargs, None) or (None, error response)."""
+    try:
+        user_id, weight, image = upload_fields(request.form, request.files)
+    except ValueError as ve:
+        return None, (jsonify({"error": str(ve)}), 400)
+    
+    choice = resolve_choice(user_id)
+    if choice is None:
+        return None, (jsonify({"error": "User profile not found"}), 404)
+    
+    timings = {}
+    try:
+        image_array = decode_image(image.read(), timings)
+    except ValueError as ve:
+        return None, (jsonify({"error": str(ve)}), 400)
+    
+    return dict(user_id=user_id, choice=choice, weight=weight, image=image_array,
+                debug=debug_requested(request.form, request.args), timings=timings), None
+
 @app.route('/', methods=['POST'])
 @app.route('/api/upload', methods=['POST'])
 def process_image():
     try:
-        weight = request.form.get('weight')
-        image = request.files.get('image')
-        user_id = request.form.get('userId')
+        job_args, error_response = parse_upload_request()
+        if error_response:
+            return error_response
         
-        if not weight or not image:
-            return jsonify({"error": "Missing required fields"}), 400
+        job = submit_job(**job_args)
+        job.wait()
+        return jsonify(job.result), 200, scan_headers(job, request.args)
+    
+    except PoolBusy as busy:
+        return busy_response(busy)
+    except Exception as e:
+        print(f"Error occurred: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_scan_job():
+    try:
+        job_args, error_response = parse_upload_request()
+        if error_response:
+            return error_response
         
-        if not user_id:
-            return jsonify({"error": "User ID is required"}), 400
+        job = submit_job(**job_args)
+        track_job(job)
+        return jsonify({"jobId": job.job_id, "status": job.status}), 202
+    
+    except PoolBusy as busy:
+        return busy_response(busy)
+    except Exception as e:
+        print(f"Error submitting job: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/upload-batch', methods=['POST'])
+def process_image_batch():
+    """Score several labels in one request. Send repeated 'image' fields with matching 'weight'
+    fields, or a single 'weight' for all of them. Each image gets its own result or error."""
+    try:
+        try:
+            user_id, uploads = batch_fields(request.form, request.files)
+        except ValueError as ve:
+            return jsonify({"error": str(ve)}), 400
         
-        user_profile = user_profiles_collection.find_one({'clerkId': user_id})
-        if not user_profile:
+        choice = resolve_choice(user_id)
+        if choice is None:
             return jsonify({"error": "User profile not found"}), 404
         
-        image_path = os.path.join(UPLOAD_FOLDER, 'captured_img.png')
-        image.save(image_path)
-        
-        result = main(determine_choice(user_profile), int(weight))
-        print(result)
-        return jsonify(result)
+        items = submit_batch(user_id, choice, uploads, debug_requested(request.form, request.args))
+        for item in items:
+            if "job" in item:
+                item["job"].wait()
+        return jsonify([batch_result(item) for item in items]), 200
     
+    except PoolBusy as busy:
+        return busy_response(busy)
     except Exception as e:
-        print(f"Error occurred: {str(e)}")
+        print(f"Error processing batch: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/rescore', methods=['POST'])
+def rescore():
+    """Score a stored scan again with a new weight and/or profile, without re-running OCR."""
+    try:
+        data = request.json or {}
+        scan_id = data.get("scanId")
+        if not scan_id:
+            return jsonify({"error": "Scan ID is required"}), 400
+        
+        scan = get_scan(scan_id)
+        # Failed and still-running jobs are stored too, but have no table to score
+        if not scan or "table" not in scan or (data.get("userId") and data["userId"] != scan.get("userId")):
+            return jsonify({"error": "Scan not found"}), 404
+        
+        try:
+            weight = int(data.get("weight", scan["weight"]))
+            choice = int(data["choice"]) if "choice" in data else None
+        except (TypeError, ValueError):
+            return jsonify({"error": "Weight and choice must be whole numbers"}), 400
+        if choice is not None:
+            if choice not in range(1, 10):
+                return jsonify({"error": "Choice must be between 1 and 9"}), 400
+        elif data.get("userId"):
+            choice = resolve_choice(data["userId"])
+            if choice is None:
+                return jsonify({"error": "User profile not found"}), 404
+        else:
+            choice = scan["choice"]
+        
+        # The scan was logged for training when it was first scored
+        result = execute_model(choice, weight, scan["table"], log=False)
+        if result is None:
+            return jsonify({"error": "Could not score this scan"}), 422
+        return jsonify(result), 200
+    except Exception as e:
+        print(f"Error rescoring scan: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_scan_job(job_id):
+    try:
+        status = job_status(job_id)
+        if not status:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(status), 200
+    except Exception as e:
+        print(f"Error fetching job {job_id}: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 def determine_choice(user_profile):
@@ -156,4 +721,7 @@ def determine_choice(user_profile):
     return 1
 
 if __name__ == '__main__':
+    ensure_indexes()
+    check_query_plans()
+    ocr_pool.start()
     app.run(host='0.0.0.0', port=os.environ.get('PORT', 5001))
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""Async serving mode for the backend.
+
+The read routes (/health, /get-history, /user-profile) use pymongo's asyncio client,
+and uploads (single and batch) hand their scans to the OCR pool and await them, so a slow
+scan never holds up history reads in the same process. Every other route is served by
+the Flask app in app.py on a pool of FLASK_THREADS threads, so one slow Flask request
+does not hold up the others either.
+
+Run with an ASGI server, e.g.: uvicorn asgi:application --port 5001
+"""
+import asyncio
+import os
+import traceback
+from a2wsgi import WSGIMiddleware
+from pymongo import ASCENDING
+from quart import Quart, request, jsonify, Response
+from werkzeug.exceptions import HTTPException
+from app import (app as flask_app, profile_versions, cached_profile, cache_profile, parse_history_request, history_page, history_chunk,
+                 upload_fields, batch_fields, submit_batch, batch_result, debug_requested, scan_headers, busy_response, HISTORY_STREAM_BATCH_SIZE)
+from db import get_async_db, user_profiles_collection, history_collection, ensure_indexes, check_query_plans
+from image_processor import decode_image
+from jobs import submit_job
+from ocr_pool import ocr_pool, PoolBusy
+
+# Threads that run Flask requests. asgiref's WsgiToAsgi would run them all on one shared thread
+FLASK_THREADS = int(os.environ.get('FLASK_THREADS', 10))
+
+async_app = Quart(__name__)
+
+@async_app.before_serving
+async def start_up():
+    await asyncio.to_thread(ensure_indexes)
+    await asyncio.to_thread(check_query_plans)
+    ocr_pool.start()
+
+@async_app.after_request
+async def add_cors_headers(response):
+    # Same policy as flask_cors in app.py; preflight requests are answered by the Flask app
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Expose-Headers'] = 'X-Scan-Id, Retry-After, Server-Timing'
+    return response
+
+def profiles():
+    return get_async_db()[user_profiles_collection.name]
+
+def history():
+    return get_async_db()[history_collection.name]
+
+async def load_profile(user_id):
+    """Async twin of app.load_profile, sharing its cache."""
+    entry = cached_profile(user_id)
+    if entry is None:
+        version = profile_versions.get(user_id)
+        entry = cache_profile(user_id, await profiles().find_one({'clerkId': user_id}, {'_id': 0}), version)
+    return entry
+
+async def wait_for_job(job):
+    """Await a Job without tying up a thread; it finishes on an OCR pool callback thread."""
+    loop = asyncio.get_running_loop()
+    finished = loop.create_future()
+
+    def resolve():
+        if not finished.done():
+            finished.set_result(job)
+
+    job.add_done_callback(lambda _: loop.call_soon_threadsafe(resolve))
+    return await finished
+
+@async_app.route('/health', methods=['GET'])
+async def get_res():
+    return jsonify({"msg": "Server is healthy"})
+
+@async_app.route('/get-history/<userId>', methods=['GET'])
+async def get_history(userId):
+    try:
+        try:
+            query, projection, limit = parse_history_request(userId, request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if limit is None:
+            cursor = history().find(query, projection).sort("_id", ASCENDING).batch_size(HISTORY_STREAM_BATCH_SIZE)
+
+            async def stream_history():
+                yield '['
+                index = 0
+                async for entry in cursor:
+                    yield history_chunk(entry, index)
+                    index += 1
+                yield ']'
+
+            return Response(stream_history(), mimetype='application/json')
+
+        entries = await history().find(query, projection).sort("_id", ASCENDING).limit(limit + 1).to_list()
+        return jsonify(history_page(entries, limit)), 200
+    except Exception as e:
+        print(f"Error fetching history for user {userId}: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@async_app.route('/user-profile/<userId>', methods=['GET'])
+async def get_user_profile(userId):
+    try:
+        user_profile, _ = await load_profile(userId)
+        if not user_profile:
+            return jsonify({"error": "User profile not found"}), 404
+        return jsonify(user_profile), 200
+    except Exception as e:
+        print(f"Error fetching user profile: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@async_app.route('/', methods=['POST'])
+@async_app.route('/api/upload', methods=['POST'])
+async def process_image():
+    try:
+        form = await request.form
+        files = await request.files
+        try:
+            user_id, weight, image = upload_fields(form, files)
+        except ValueError as ve:
+            return jsonify({"error": str(ve)}), 400
+
+        _, choice = await load_profile(user_id)
+        if choice is None:
+            return jsonify({"error": "User profile not found"}), 404
+
+        timings = {}
+        try:
+            image_array = await asyncio.to_thread(decode_image, image.read(), timings)
+        except ValueError as ve:
+            return jsonify({"error": str(ve)}), 400
+
+        # Cache hits are scored and saved right inside submit_job, so keep it off the event loop
+        job = await asyncio.to_thread(submit_job, user_id, choice, weight, image_array,
+                                      debug_requested(form, request.args), timings=timings)
+        await wait_for_job(job)
+        return jsonify(job.result), 200, scan_headers(job, request.args)
+
+    except PoolBusy as busy:
+        return busy_response(busy)
+    except Exception as e:
+        print(f"Error occurred: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@async_app.route('/api/upload-batch', methods=['POST'])
+async def process_image_batch():
+    """Same contract as the Flask route: one result or error per image."""
+    try:
+        form = await request.form
+        files = await request.files
+        try:
+            user_id, uploads = batch_fields(form, files)
+        except ValueError as ve:
+            return jsonify({"error": str(ve)}), 400
+
+        _, choice = await load_profile(user_id)
+        if choice is None:
+            return jsonify({"error": "User profile not found"}), 404
+
+        items = await asyncio.to_thread(submit_batch, user_id, choice, uploads, debug_requested(form, request.args))
+        for item in items:
+            if "job" in item:
+                await wait_for_job(item["job"])
+        return jsonify([batch_result(item) for item in items]), 200
+
+    except PoolBusy as busy:
+        return busy_response(busy)
+    except Exception as e:
+        print(f"Error processing batch: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+flask_asgi = WSGIMiddleware(flask_app, workers=FLASK_THREADS)
+
+def handled_by_async_app(scope):
+    if scope['type'] == 'lifespan':
+        return True
+    if scope['type'] != 'http' or scope['method'] == 'OPTIONS':
+        return False
+    try:
+        async_app.url_map.bind('').match(scope['path'], method=scope['method'])
+        return True
+    except HTTPException:
+        return False
+
+async def application(scope, receive, send):
+    """Send the async routes to the Quart app and everything else to the Flask app."""
+    if handled_by_async_app(scope):
+        await async_app(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(application, host='0.0.0.0', port=int(os.environ.get('PORT', 5001)))
@@ -0,0 +1,166 @@
+"""Micro-benchmark for table_geometry.assign_cells against the original per-cell loop.
+
+Generates label-shaped OCR layouts with a growing number of text boxes, builds the
+row/column lines the way image_processor does, checks both grids are identical and
+prints the timings. It also rebuilds whole grids on straight and skewed layouts, the
+way image_processor does (deskew_boxes, cluster_rows) and the way it did before (NMS
+over full-width row bands), and checks how many table rows come out intact.
+Run from src/backend: python benchmarks/bench_grid.py
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from table_geometry import non_max_suppression, assign_cells, cluster_rows, deskew_boxes
+
+def loop_assign_cells(horiz_boxes, horiz_lines, vert_boxes, vert_lines, ordered_boxes, boxes, texts):
+    """The original O(H*V*B) cell-filling loop from image_processor, kept as the reference."""
+    def intersection(box_1, box_2):
+        return [box_2[0], box_1[1], box_2[2], box_1[3]]
+
+    def iou(box_1, box_2):
+        x_1 = max(box_1[0], box_2[0])
+        y_1 = max(box_1[1], box_2[1])
+        x_2 = min(box_1[2], box_2[2])
+        y_2 = min(box_1[3], box_2[3])
+
+        inter = abs(max((x_2 - x_1, 0)) * max((y_2 - y_1), 0))
+        if inter == 0:
+            return 0
+
+        box_1_area = abs((box_1[2] - box_1[0]) * (box_1[3] - box_1[1]))
+        box_2_area = abs((box_2[2] - box_2[0]) * (box_2[3] - box_2[1]))
+
+        return inter / float(box_1_area + box_2_area - inter)
+
+    out_array = [["" for i in range(len(vert_lines))] for j in range(len(horiz_lines))]
+    for i in range(len(horiz_lines)):
+        for j in range(len(vert_lines)):
+            resultant = intersection(horiz_boxes[horiz_lines[i]], vert_boxes[vert_lines[ordered_boxes[j]]])
+            for b in range(len(boxes)):
+                the_box = [boxes[b][0][0], boxes[b][0][1], boxes[b][2][0], boxes[b][2][1]]
+                if iou(resultant, the_box) > 0.1:
+                    out_array[i][j] = texts[b]
+    return np.array(out_array)
+
+def sample_layout(rng, n_boxes, cols=3, width=900, skew=0.0):
+    """Float OCR boxes laid out as a table with cols columns, like PaddleOCR output.
+    skew rotates the whole table by that many degrees about its top-left corner."""
+    boxes, texts, probabilities = [], [], []
+    col_x = np.linspace(20, width - 220, cols)
+    slope = np.tan(np.radians(skew))
+    for k in range(n_boxes):
+        r, c = divmod(k, cols)
+        x0 = col_x[c] + rng.uniform(-6, 6)
+        y0 = 30 + r * 38 + rng.uniform(-4, 4)
+        w, h = rng.uniform(60, 200), rng.uniform(18, 30)
+        corners = [[x0, y0], [x0 + w, y0], [x0 + w, y0 + h], [x0, y0 + h]]
+        boxes.append([[x - y * slope, y + x * slope] for x, y in corners])
+        texts.append(f"text{k}")
+        probabilities.append(rng.uniform(0.5, 1.0))
+    return boxes, texts, probabilities
+
+def build_lines(boxes, probabilities, image_width, image_height):
+    """Row and column lines as image_processor builds them. Returns the deskewed boxes with them."""
+    boxes = deskew_boxes(boxes)
+    horiz_boxes, vert_boxes = [], []
+    for box in boxes:
+        horiz_boxes.append([0, int(box[0][1]), image_width, int(box[0][1]) + int(box[2][1] - box[0][1])])
+        vert_boxes.append([int(box[0][0]), 0, int(box[0][0]) + int(box[2][0] - box[0][0]), image_height])
+    horiz_lines = np.array([min(row, key=lambda i: (-probabilities[i], i)) for row in cluster_rows(boxes)])
+    vert_lines = np.sort(non_max_suppression(vert_boxes, probabilities, 1000, 0.1))
+    ordered_boxes = np.argsort([vert_boxes[i][0] for i in vert_lines])
+    return boxes, horiz_boxes, horiz_lines, vert_boxes, vert_lines, ordered_boxes
+
+def pipeline_grid(boxes, texts, probabilities, image_width, image_height):
+    boxes, horiz_boxes, horiz_lines, vert_boxes, vert_lines, ordered_boxes = build_lines(
+        boxes, probabilities, image_width, image_height)
+    return assign_cells(
+        [horiz_boxes[i] for i in horiz_lines],
+        [vert_boxes[vert_lines[j]] for j in ordered_boxes],
+        [[box[0][0], box[0][1], box[2][0], box[2][1]] for box in boxes],
+        texts)
+
+def nms_grid(boxes, texts, probabilities, image_width, image_height):
+    """The grid before cluster_rows and deskewing: NMS over full-width row bands of the raw boxes."""
+    horiz_boxes = [[0, int(box[0][1]), image_width, int(box[0][1]) + int(box[2][1] - box[0][1])] for box in boxes]
+    vert_boxes = [[int(box[0][0]), 0, int(box[0][0]) + int(box[2][0] - box[0][0]), image_height] for box in boxes]
+    horiz_lines = np.sort(non_max_suppression(horiz_boxes, probabilities, 1000, 0.1))
+    vert_lines = np.sort(non_max_suppression(vert_boxes, probabilities, 1000, 0.1))
+    ordered_boxes = np.argsort([vert_boxes[i][0] for i in vert_lines])
+    return assign_cells(
+        [horiz_boxes[i] for i in horiz_lines],
+        [vert_boxes[vert_lines[j]] for j in ordered_boxes],
+        [[box[0][0], box[0][1], box[2][0], box[2][1]] for box in boxes],
+        texts)
+
+def rows_intact(grid, texts, cols):
+    """How many of the layout's table rows come out as one grid row holding exactly their texts, in order."""
+    found = {tuple(row) for row in grid.tolist()}
+    return sum(tuple(texts[k:k + cols]) in found for k in range(0, len(texts), cols))
+
+def check_grids(rng, layouts=300):
+    """Rebuild the grid of each layout both ways and count the table rows that come out intact.
+    Returns the number of failures: straight layouts where the grids differ, plus skews where
+    the pipeline keeps fewer rows intact than NMS, or loses any row at all up to 3 degrees."""
+    print(f"{'skew':>5} {'layouts':>8} {'rows':>6} {'nms intact':>11} {'pipeline intact':>16}")
+    failures = 0
+    for skew in (0.0, 1.0, 2.0, 2.5, 3.0):
+        total = nms_intact = pipeline_intact = 0
+        for _ in range(layouts):
+            cols = int(rng.integers(2, 4))
+            table_rows = int(rng.integers(4, 16))
+            boxes, texts, probabilities = sample_layout(rng, table_rows * cols, cols=cols, skew=skew)
+            image_height = 60 + table_rows * 38 + 60
+            nms = nms_grid(boxes, texts, probabilities, 900, image_height)
+            pipeline = pipeline_grid(boxes, texts, probabilities, 900, image_height)
+            total += table_rows
+            nms_intact += rows_intact(nms, texts, cols)
+            pipeline_intact += rows_intact(pipeline, texts, cols)
+            if skew == 0.0:
+                failures += not np.array_equal(nms, pipeline)
+        if pipeline_intact < nms_intact or pipeline_intact < total:
+            failures += 1
+        print(f"{skew:>5.1f} {layouts:>8} {total:>6} {nms_intact / total:>11.3f} {pipeline_intact / total:>16.3f}")
+    print()
+    return failures
+
+def main():
+    rng = np.random.default_rng(0)
+    if check_grids(rng):
+        print("The pipeline's grid loses table rows")
+        return 1
+    print(f"{'boxes':>6} {'rows x cols':>12} {'loop ms':>10} {'numpy ms':>10} {'speedup':>8}")
+    for n_boxes in (10, 20, 40, 60, 90, 120, 200):
+        boxes, texts, probabilities = sample_layout(rng, n_boxes)
+        image_height = 60 + (n_boxes // 3 + 1) * 38
+        boxes, horiz_boxes, horiz_lines, vert_boxes, vert_lines, ordered_boxes = build_lines(
+            boxes, probabilities, 900, image_height)
+
+        def run_loop():
+            return loop_assign_cells(horiz_boxes, horiz_lines, vert_boxes, vert_lines,
+                                     ordered_boxes, boxes, texts)
+
+        def run_numpy():
+            return assign_cells(
+                [horiz_boxes[i] for i in horiz_lines],
+                [vert_boxes[vert_lines[j]] for j in ordered_boxes],
+                [[box[0][0], box[0][1], box[2][0], box[2][1]] for box in boxes],
+                texts)
+
+        if not np.array_equal(run_loop(), run_numpy()):
+            print(f"Grid mismatch at {n_boxes} boxes")
+            return 1
+
+        repeats = 5
+        loop_ms = min(timeit.repeat(run_loop, number=1, repeat=repeats)) * 1000
+        numpy_ms = min(timeit.repeat(run_numpy, number=1, repeat=repeats)) * 1000
+        shape = f"{len(horiz_lines)} x {len(vert_lines)}"
+        print(f"{n_boxes:>6} {shape:>12} {loop_ms:>10.2f} {numpy_ms:>10.2f} {loop_ms / numpy_ms:>7.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
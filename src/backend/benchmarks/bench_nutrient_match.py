@@ -0,0 +1,75 @@
+"""Parity and timing check for image_processor.match_nutrients against per-row extractOne.
+
+Builds row names from the synthetic label spellings plus common variants, with random
+OCR-style character errors, and matches them both ways. Names that miss the alias index
+must get the same key and score as extractOne; names that hit it are listed when the key
+differs from what extractOne would have accepted.
+
+Run from src/backend: python benchmarks/bench_nutrient_match.py [--names 5000] [--max-errors 2]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from rapidfuzz import process, fuzz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_processor import (KNOWN_NUTRIENTS, NUTRIENT_ALIASES, NUTRIENT_MATCH_SCORE, match_nutrients,
+                             normalize_nutrient_name)
+from synthetic_labels import NUTRIENT_ROWS
+
+EXTRA_SPELLINGS = [
+    "Calories", "Energy (kcal)", "Energy kJ", "Sodium mg", "Total Carbohydrate", "Dietary Fibre",
+    "Total Sugars", "Added Sugars", "of which saturates", "Sat. Fat", "Thiamin", "Vitamin B12",
+    "Nutrition Facts", "Per 100 g", "Serving size", "",
+]
+
+def corrupt(name, rng, max_errors):
+    chars = list(name)
+    for _ in range(rng.randint(0, max_errors)):
+        if chars:
+            chars[rng.randrange(len(chars))] = rng.choice("abcdefghijklmnopqrstuvwxyz0 ")
+    return "".join(chars)
+
+def accepted(match, score):
+    return match if score > NUTRIENT_MATCH_SCORE else None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--names', type=int, default=5000)
+    parser.add_argument('--max-errors', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    spellings = [row[0] for row in NUTRIENT_ROWS] + EXTRA_SPELLINGS
+    names = [corrupt(rng.choice(spellings), rng, args.max_errors).strip().upper() for _ in range(args.names)]
+
+    started = time.perf_counter()
+    reference = [process.extractOne(name, KNOWN_NUTRIENTS, scorer=fuzz.partial_ratio)[:2] for name in names]
+    reference_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    matches = match_nutrients(names)
+    indexed_ms = (time.perf_counter() - started) * 1000
+
+    fuzzy_mismatches = 0
+    changed = set()
+    for name, (ref_match, ref_score), (match, score) in zip(names, reference, matches):
+        if normalize_nutrient_name(name) in NUTRIENT_ALIASES:
+            if accepted(ref_match, ref_score) != match:
+                changed.add((name, accepted(ref_match, ref_score), match))
+        elif (ref_match, round(ref_score, 6)) != (match, round(score, 6)):
+            fuzzy_mismatches += 1
+
+    print(f"{len(names)} names: extractOne {reference_ms:.1f} ms, match_nutrients {indexed_ms:.1f} ms")
+    print(f"accepted: extractOne {sum(accepted(*r) is not None for r in reference)}, "
+          f"match_nutrients {sum(accepted(*m) is not None for m in matches)}")
+    for name, before, after in sorted(changed, key=str):
+        print(f"alias changed {name!r}: {before} -> {after}")
+    print(f"fuzzy mismatches: {fuzzy_mismatches}")
+    return 1 if fuzzy_mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""End-to-end scan benchmark on synthetic nutrition labels, with regression thresholds.
+
+Renders labels with synthetic_labels.py over a grid of row counts, font sizes, skews and
+noise levels, and runs each one through decode_image, process_image and execute_model.
+It reports per-stage latency percentiles, throughput, extraction accuracy and peak RSS,
+and exits 1 when a threshold or a baseline comparison fails, so it can gate CI.
+
+Runs offline on CPU. Point PADDLEOCR_DET_MODEL_DIR, PADDLEOCR_REC_MODEL_DIR and
+PADDLEOCR_CLS_MODEL_DIR at local model directories to avoid any download.
+
+Run from src/backend: python benchmarks/bench_pipeline.py [--max-p95-ms 8000] [--min-accuracy 0.8]
+    [--max-rss-mb 3000] [--baseline baseline.json --tolerance 0.25] [--save-baseline baseline.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import model
+from image_processor import decode_image, process_image, load_ocr, warm_up_ocr
+from metrics import timed
+from synthetic_labels import label_variants
+
+STAGES = ('decode', 'detect_panel', 'preprocess', 'ocr', 'grid', 'nms', 'clean_data', 'execute_model')
+
+def parse_list(value, cast=float):
+    return tuple(cast(item) for item in value.split(','))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=lambda v: parse_list(v, int), default=(6, 12))
+    parser.add_argument('--font-scales', type=parse_list, default=(0.6, 0.9))
+    parser.add_argument('--skews', type=parse_list, default=(0.0, 3.0))
+    parser.add_argument('--noise', type=parse_list, default=(0.0, 12.0))
+    parser.add_argument('--per-variant', type=int, default=1, help='labels rendered per setting combination')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-p95-ms', type=float, help='fail if the p95 end-to-end scan time is above this')
+    parser.add_argument('--min-accuracy', type=float, help='fail if fewer nutrients than this fraction are read correctly')
+    parser.add_argument('--max-rss-mb', type=float, help='fail if peak RSS is above this')
+    parser.add_argument('--baseline', help='JSON report from --save-baseline to compare stage p50s against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p50 slowdown per stage vs the baseline')
+    parser.add_argument('--save-baseline', help='write this run\'s report as JSON')
+    return parser.parse_args()
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+def run_scan(image, stats=None):
+    """Run one label through the pipeline. Returns (nutrition_data, timings in seconds).
+    process_image's stats (box count, panel region) are left in the stats dict if one is given."""
+    timings = {}
+    encoded = cv2.imencode('.png', image)[1].tobytes()
+    with timed(timings, 'decode'):
+        decoded = decode_image(encoded)
+    stats = {} if stats is None else stats
+    nutrition_data = process_image(decoded, stats=stats)
+    timings.update(stats['timings'])
+    with timed(timings, 'execute_model'):
+        model.execute_model(1, 100, nutrition_data)
+    return nutrition_data, timings
+
+def correct_nutrients(nutrition_data, expected):
+    return sum(1 for key, amount in expected.items() if abs(nutrition_data.get(key, -1) - amount) < 1e-6)
+
+def build_report(samples, correct, expected_total, wall_seconds):
+    stages = {}
+    for stage in STAGES:
+        values = [timings[stage] * 1000 for timings in samples if stage in timings]
+        if values:
+            stages[stage] = {"p50_ms": float(np.percentile(values, 50)), "p95_ms": float(np.percentile(values, 95))}
+    totals = [sum(timings.values()) * 1000 for timings in samples]
+    return {
+        "scans": len(samples),
+        "stages": stages,
+        "total_p50_ms": float(np.percentile(totals, 50)),
+        "total_p95_ms": float(np.percentile(totals, 95)),
+        "throughput_per_s": len(samples) / wall_seconds,
+        "accuracy": correct / expected_total if expected_total else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def check_thresholds(report, args):
+    failures = []
+    if args.max_p95_ms is not None and report["total_p95_ms"] > args.max_p95_ms:
+        failures.append(f"p95 scan time {report['total_p95_ms']:.1f} ms > {args.max_p95_ms} ms")
+    if args.min_accuracy is not None and report["accuracy"] < args.min_accuracy:
+        failures.append(f"accuracy {report['accuracy']:.3f} < {args.min_accuracy}")
+    if args.max_rss_mb is not None and report["peak_rss_mb"] > args.max_rss_mb:
+        failures.append(f"peak RSS {report['peak_rss_mb']:.0f} MB > {args.max_rss_mb} MB")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for stage, numbers in baseline.get("stages", {}).items():
+            current = report["stages"].get(stage)
+            # Sub-millisecond stages are too noisy to compare
+            if current and numbers["p50_ms"] >= 1.0 and current["p50_ms"] > numbers["p50_ms"] * (1 + args.tolerance):
+                failures.append(f"{stage} p50 {current['p50_ms']:.1f} ms vs baseline {numbers['p50_ms']:.1f} ms")
+    return failures
+
+def main():
+    args = parse_args()
+    # Keep the training log out of the measurement
+    model.dataset_log.append = lambda *a, **k: None
+
+    print("Loading and warming up PaddleOCR...")
+    load_ocr()
+    warm_up_ocr()
+
+    samples = []
+    correct = expected_total = 0
+    started = time.perf_counter()
+    variants = label_variants(args.rows, args.font_scales, args.skews, args.noise, args.per_variant, args.seed)
+    for description, image, expected in variants:
+        with contextlib.redirect_stdout(io.StringIO()):
+            nutrition_data, timings = run_scan(image)
+        hits = correct_nutrients(nutrition_data, expected)
+        correct += hits
+        expected_total += len(expected)
+        samples.append(timings)
+        print(f"{description:<40} {sum(timings.values()) * 1000:9.1f} ms   {hits}/{len(expected)} nutrients")
+    report = build_report(samples, correct, expected_total, time.perf_counter() - started)
+
+    print(f"\n{'stage':<14} {'p50 ms':>9} {'p95 ms':>9}")
+    for stage, numbers in report["stages"].items():
+        print(f"{stage:<14} {numbers['p50_ms']:>9.2f} {numbers['p95_ms']:>9.2f}")
+    print(f"{'total':<14} {report['total_p50_ms']:>9.2f} {report['total_p95_ms']:>9.2f}")
+    print(f"\n{report['scans']} scans, {report['throughput_per_s']:.2f} scans/s, "
+          f"accuracy {report['accuracy']:.3f}, peak RSS {report['peak_rss_mb']:.0f} MB")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failures = check_thresholds(report, args)
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
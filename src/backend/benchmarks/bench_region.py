@@ -0,0 +1,62 @@
+"""Compare OCR on the whole frame with OCR on the detected nutrition panel.
+
+Runs the synthetic labels on their own and placed on busy packaging backgrounds, with
+image_processor.OCR_CROP_PANEL off and on, and prints the mean scan and OCR time, the
+number of OCR boxes fed to table reconstruction, how often a panel was found and the
+share of nutrients read correctly.
+
+Run from src/backend: python benchmarks/bench_region.py [--rows 6,12]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import image_processor
+import model
+from bench_pipeline import run_scan, correct_nutrients, parse_list
+from synthetic_labels import label_variants, render_package
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=lambda v: parse_list(v, int), default=(6, 12))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    model.dataset_log.append = lambda *a, **k: None
+    image_processor.load_ocr()
+    image_processor.warm_up_ocr()
+
+    labels = [(image, expected) for _, image, expected in
+              label_variants(args.rows, (0.6, 0.9), (0.0, 2.0), (0.0, 6.0), seed=args.seed)]
+    scenes = {
+        'label': labels,
+        'package': [(render_package(image, args.seed + index), expected) for index, (image, expected) in enumerate(labels)],
+    }
+    print(f"{len(labels)} images per row\n")
+    print(f"{'scene':<8} {'crop':>5} {'scan ms':>9} {'ocr ms':>9} {'boxes':>7} {'found':>6} {'accuracy':>9}")
+    for scene, images in scenes.items():
+        for crop in (False, True):
+            image_processor.OCR_CROP_PANEL = crop
+            scan_ms, ocr_ms, boxes = [], [], []
+            found = correct = total = 0
+            for image, expected in images:
+                stats = {}
+                with contextlib.redirect_stdout(io.StringIO()):
+                    nutrition_data, timings = run_scan(image, stats)
+                scan_ms.append(sum(timings.values()) * 1000)
+                ocr_ms.append(timings['ocr'] * 1000)
+                boxes.append(stats['ocr_boxes'])
+                found += stats.get('panel') is not None
+                correct += correct_nutrients(nutrition_data, expected)
+                total += len(expected)
+            print(f"{scene:<8} {'on' if crop else 'off':>5} {np.mean(scan_ms):>9.1f} {np.mean(ocr_ms):>9.1f} "
+                  f"{np.mean(boxes):>7.1f} {found / len(images) if crop else 0:>6.2f} {correct / total:>9.3f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Latency/accuracy sweep for the OCR resolution cap (image_processor.OCR_MAX_SIDE).
+
+Renders the synthetic labels, enlarges them to mimic small crops and full phone photos,
+and runs every label through the pipeline under each cap. It prints the mean scan and
+OCR time and the share of nutrients read correctly.
+
+Run from src/backend: python benchmarks/bench_resolution.py [--max-sides 960,1280,1600,2000,0]
+    [--photo-scales 1,3,6]   (0 in --max-sides means uncapped, i.e. always 1.5x)
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import image_processor
+import model
+from bench_pipeline import run_scan, correct_nutrients, parse_list
+from synthetic_labels import label_variants
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--max-sides', type=lambda v: parse_list(v, int), default=(960, 1280, 1600, 2000, 0))
+    parser.add_argument('--photo-scales', type=parse_list, default=(1.0, 3.0, 6.0))
+    parser.add_argument('--rows', type=lambda v: parse_list(v, int), default=(6, 12))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    model.dataset_log.append = lambda *a, **k: None
+    image_processor.load_ocr()
+    image_processor.warm_up_ocr()
+
+    labels = list(label_variants(args.rows, (0.6, 0.9), (0.0, 2.0), (0.0, 6.0), seed=args.seed))
+    print(f"{len(labels)} labels per cell\n")
+    print(f"{'photo':>6} {'long side':>10} {'max side':>9} {'scan ms':>9} {'ocr ms':>9} {'accuracy':>9}")
+    for photo_scale in args.photo_scales:
+        photos = [(cv2.resize(image, (0, 0), fx=photo_scale, fy=photo_scale, interpolation=cv2.INTER_CUBIC), expected)
+                  for _, image, expected in labels]
+        long_side = int(np.mean([max(photo.shape[:2]) for photo, _ in photos]))
+        for max_side in args.max_sides:
+            image_processor.OCR_MAX_SIDE = max_side
+            scan_ms, ocr_ms = [], []
+            correct = total = 0
+            for photo, expected in photos:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    nutrition_data, timings = run_scan(photo)
+                scan_ms.append(sum(timings.values()) * 1000)
+                ocr_ms.append(timings['ocr'] * 1000)
+                correct += correct_nutrients(nutrition_data, expected)
+                total += len(expected)
+            cap = str(max_side) if max_side else 'none'
+            print(f"{photo_scale:>5.0f}x {long_side:>10} {cap:>9} {np.mean(scan_ms):>9.1f} {np.mean(ocr_ms):>9.1f} "
+                  f"{correct / total:>9.3f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""Compare scoring.score_matrix with calling model.execute_model once per (profile, weight).
+
+Checks that every rating is identical and times both ways over all nine profiles and
+50 portion sizes. Run from src/backend: python benchmarks/bench_scoring.py
+"""
+import contextlib
+import io
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import model
+from scoring import score_matrix, PROFILE_CHOICES
+
+SAMPLE_LABELS = [
+    {"ENERGY": 250.0, "PROTEINS": 10.0, "TOTAL_FAT": 12.5, "SODIUM": 400.0, "SUGAR": 20.0, "FIBER": 3.0},
+    {"ENERGY": 480.0, "CARBOHYDRATES": 62.0, "SUGAR": 35.5, "TOTAL_FAT": 24.0, "SATURATED_FAT": 14.2,
+     "PROTEINS": 6.1, "SODIUM": 180.0},
+    {"ENERGY": 90.0, "PROTEINS": 3.4, "CALCIUM": 120.0, "VITAMIN_D": 1.2, "SUGAR": 4.8, "TOTAL_FAT": 3.5},
+    {"ENERGY": 375.0, "FIBER": 9.8, "IRON": 12.0, "VITAMIN_B12": 0.8, "FOLATE": 140.0, "SODIUM": 650.0,
+     "CHOLESTEROL": 0.0, "MAGNESIUM": 95.0},
+]
+WEIGHTS = list(range(10, 510, 10))
+
+def loop_ratings(label):
+    ratings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for choice in PROFILE_CHOICES:
+            row = []
+            for weight in WEIGHTS:
+                result = model.execute_model(choice, weight, label)
+                row.append(math.nan if result is None else result[0])
+            ratings.append(row)
+    return ratings
+
+def main():
+    # Keep the training log out of the measurement
+    model.dataset_log.append = lambda *args, **kwargs: None
+
+    pairs = len(PROFILE_CHOICES) * len(WEIGHTS)
+    print(f"{len(PROFILE_CHOICES)} profiles x {len(WEIGHTS)} weights = {pairs} ratings per label")
+    for index, label in enumerate(SAMPLE_LABELS):
+        start = time.perf_counter()
+        expected = loop_ratings(label)
+        loop_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        actual = score_matrix(label, PROFILE_CHOICES, WEIGHTS)
+        matrix_ms = (time.perf_counter() - start) * 1000
+
+        for choice_row, actual_row in zip(expected, actual.tolist()):
+            for want, got in zip(choice_row, actual_row):
+                if not (want == got or (math.isnan(want) and math.isnan(got))):
+                    print(f"Label {index}: execute_model gave {want}, score_matrix gave {got}")
+                    return 1
+        print(f"label {index}: loop {loop_ms:8.2f} ms   matrix {matrix_ms:6.2f} ms   {loop_ms / matrix_ms:6.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Check table_geometry.non_max_suppression against tf.image.non_max_suppression.
+
+Builds the horizontal and vertical band boxes exactly like image_processor does from
+label-shaped OCR layouts (plus random clutter) and compares the selected indices.
+Needs TensorFlow installed; run from src/backend: python benchmarks/nms_parity.py
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from table_geometry import non_max_suppression
+
+def sample_label(rng, rows, cols, width=900, row_height=38):
+    """OCR-style 4-point boxes and scores for a rows x cols nutrition table with jitter."""
+    boxes, scores = [], []
+    col_x = np.linspace(20, width - 220, cols).astype(int)
+    for r in range(rows):
+        top = 30 + r * row_height + rng.integers(-4, 5)
+        for x in col_x:
+            x0 = x + rng.integers(-6, 7)
+            w = rng.integers(60, 200)
+            h = rng.integers(18, 30)
+            boxes.append([[x0, top], [x0 + w, top], [x0 + w, top + h], [x0, top + h]])
+            scores.append(float(rng.uniform(0.5, 1.0)))
+    # Packaging text that is not part of the table
+    for _ in range(rng.integers(0, 8)):
+        x0, y0 = rng.integers(0, width - 100), rng.integers(0, rows * row_height + 60)
+        w, h = rng.integers(30, 300), rng.integers(10, 60)
+        boxes.append([[x0, y0], [x0 + w, y0], [x0 + w, y0 + h], [x0, y0 + h]])
+        scores.append(float(rng.uniform(0.3, 1.0)))
+    return boxes, scores
+
+def band_boxes(boxes, image_width, image_height):
+    horiz_boxes, vert_boxes = [], []
+    for box in boxes:
+        horiz_boxes.append([0, int(box[0][1]), image_width, int(box[0][1]) + int(box[2][1] - box[0][1])])
+        vert_boxes.append([int(box[0][0]), 0, int(box[0][0]) + int(box[2][0] - box[0][0]), image_height])
+    return horiz_boxes, vert_boxes
+
+def main():
+    try:
+        import tensorflow as tf
+    except ImportError:
+        print("TensorFlow is not installed, nothing to compare against.")
+        return 2
+
+    rng = np.random.default_rng(0)
+    mismatches = 0
+    cases = 0
+    for rows in (4, 8, 12, 20):
+        for cols in (2, 3, 4):
+            for _ in range(10):
+                boxes, scores = sample_label(rng, rows, cols)
+                # Repeated scores exercise the tie-breaking order
+                if rng.random() < 0.3:
+                    scores = [round(s, 1) for s in scores]
+                for bands in band_boxes(boxes, 900, rows * 38 + 120):
+                    expected = np.sort(np.array(tf.image.non_max_suppression(
+                        bands, scores, max_output_size=1000, iou_threshold=0.1,
+                        score_threshold=float('-inf'))))
+                    actual = np.sort(non_max_suppression(
+                        bands, scores, max_output_size=1000, iou_threshold=0.1,
+                        score_threshold=float('-inf')))
+                    cases += 1
+                    if not np.array_equal(expected, actual):
+                        mismatches += 1
+                        print(f"Mismatch rows={rows} cols={cols}: tf={expected.tolist()} numpy={actual.tolist()}")
+
+    print(f"{cases - mismatches}/{cases} cases match")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
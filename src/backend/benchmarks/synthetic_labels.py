@@ -0,0 +1,133 @@
+"""Render synthetic nutrition-facts tables with OpenCV, with their ground truth.
+
+Used by the pipeline benchmarks so they run offline without a folder of label photos.
+Run from src/backend to write a few samples: python benchmarks/synthetic_labels.py out_dir
+"""
+import os
+import sys
+
+import cv2
+import numpy as np
+
+# Printed name, the KNOWN_NUTRIENTS key it should map to, unit, value range, decimals
+NUTRIENT_ROWS = [
+    ("Energy", "ENERGY", "kcal", (40, 600), 0),
+    ("Protein", "PROTEINS", "g", (0.5, 30), 1),
+    ("Total Fat", "TOTAL_FAT", "g", (0.5, 40), 1),
+    ("Saturated Fat", "SATURATED_FAT", "g", (0.1, 20), 1),
+    ("Trans Fat", "TRANS_FAT", "g", (0.1, 2), 1),
+    ("Cholesterol", "CHOLESTEROL", "mg", (1, 120), 0),
+    ("Carbohydrates", "CARBOHYDRATES", "g", (1, 80), 1),
+    ("Fiber", "FIBER", "g", (0.5, 15), 1),
+    ("Sugar", "SUGAR", "g", (0.5, 50), 1),
+    ("Sodium", "SODIUM", "mg", (5, 900), 0),
+    ("Potassium", "POTASSIUM", "mg", (10, 600), 0),
+    ("Calcium", "CALCIUM", "mg", (5, 400), 0),
+    ("Iron", "IRON", "mg", (0.5, 15), 1),
+    ("Magnesium", "MAGNESIUM", "mg", (5, 200), 0),
+    ("Vitamin C", "VITAMIN_C", "mg", (1, 90), 0),
+]
+
+FONTS = (cv2.FONT_HERSHEY_SIMPLEX, cv2.FONT_HERSHEY_DUPLEX)
+
+def render_label(rows=8, font_scale=0.8, skew=0.0, noise=0.0, seed=0, font=cv2.FONT_HERSHEY_SIMPLEX):
+    """Draw a nutrition table and return (BGR image, {nutrient: amount per 100 g}).
+
+    rows is the number of nutrient rows (at most len(NUTRIENT_ROWS)), skew a rotation in
+    degrees and noise the standard deviation of the Gaussian pixel noise.
+    """
+    rng = np.random.default_rng(seed)
+    picked = sorted(rng.choice(len(NUTRIENT_ROWS), size=min(rows, len(NUTRIENT_ROWS)), replace=False))
+    thickness = max(1, int(round(font_scale * 2)))
+    row_height = int(48 * font_scale) + 12
+    width = int(560 * font_scale) + 80
+    height = row_height * (len(picked) + 2) + 40
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+
+    def put(text, x, y, scale=font_scale):
+        cv2.putText(image, text, (x, y), font, scale, (0, 0, 0), thickness, cv2.LINE_AA)
+
+    put("Nutrition Facts", 30, row_height, font_scale * 1.2)
+    put("Per 100 g", 30, 2 * row_height)
+    cv2.line(image, (20, 2 * row_height + 12), (width - 20, 2 * row_height + 12), (0, 0, 0), 3)
+
+    expected = {}
+    for position, index in enumerate(picked):
+        name, key, unit, (low, high), decimals = NUTRIENT_ROWS[index]
+        amount = round(float(rng.uniform(low, high)), decimals)
+        amount_text = f"{amount:.{decimals}f} {unit}"
+        y = (position + 3) * row_height
+        put(name, 30, y)
+        (text_width, _), _ = cv2.getTextSize(amount_text, font, font_scale, thickness)
+        put(amount_text, width - 30 - text_width, y)
+        cv2.line(image, (20, y + 12), (width - 20, y + 12), (0, 0, 0), 1)
+        expected[key] = amount
+
+    if skew:
+        # Rotate on a larger white canvas so the corners are not cut off
+        pad = int(max(height, width) * abs(np.sin(np.radians(skew)))) + 10
+        image = cv2.copyMakeBorder(image, pad, pad, pad, pad, cv2.BORDER_CONSTANT, value=(255, 255, 255))
+        center = (image.shape[1] / 2, image.shape[0] / 2)
+        matrix = cv2.getRotationMatrix2D(center, skew, 1.0)
+        image = cv2.warpAffine(image, matrix, (image.shape[1], image.shape[0]), borderValue=(255, 255, 255))
+    if noise:
+        image = np.clip(image + rng.normal(0, noise, image.shape), 0, 255).astype(np.uint8)
+    return image, expected
+
+PACKAGE_TEXT = [
+    "CRUNCHY OATS", "Whole grain goodness", "Ingredients: whole oats, wheat flour, cane sugar, palm oil, salt",
+    "Best before: see top of pack", "Store in a cool dry place", "Net wt 500 g", "Made with love since 1987",
+]
+
+def render_package(label, seed=0):
+    """Place a rendered label on a larger, busy packaging background with brand text, art and blurbs."""
+    rng = np.random.default_rng(seed)
+    label_height, label_width = label.shape[:2]
+    height, width = int(label_height * 2.2), int(label_width * 2.6)
+    background = np.array(rng.integers(150, 256, 3), dtype=np.uint8)
+    canvas = np.empty((height, width, 3), dtype=np.uint8)
+    canvas[:] = background
+    for _ in range(6):
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        cv2.circle(canvas, center, int(rng.integers(20, max(21, width // 6))), color, -1)
+    top = int(rng.integers(0, height - label_height))
+    left = int(rng.integers(0, width - label_width))
+    # Blurbs go where the label is not, like on a real pack
+    for text in PACKAGE_TEXT:
+        scale = float(rng.uniform(0.6, 2.0)) if text.isupper() else float(rng.uniform(0.5, 0.9))
+        (text_width, text_height), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, 2)
+        for _ in range(20):
+            x = int(rng.integers(0, max(1, width - text_width)))
+            y = int(rng.integers(text_height, height))
+            if x + text_width < left or x > left + label_width or y < top or y - text_height > top + label_height:
+                cv2.putText(canvas, text, (x, y), cv2.FONT_HERSHEY_SIMPLEX, scale, (20, 20, 20), 2, cv2.LINE_AA)
+                break
+    canvas[top:top + label_height, left:left + label_width] = label
+    return canvas
+
+def label_variants(rows=(6, 12), font_scales=(0.6, 0.9), skews=(0.0, 3.0), noises=(0.0, 12.0), per_variant=1, seed=0):
+    """Yield (description, image, expected) over every combination of the settings."""
+    count = 0
+    for row_count in rows:
+        for font_scale in font_scales:
+            for skew in skews:
+                for noise in noises:
+                    for _ in range(per_variant):
+                        font = FONTS[count % len(FONTS)]
+                        image, expected = render_label(row_count, font_scale, skew, noise, seed + count, font)
+                        description = f"rows={row_count} font={font_scale} skew={skew} noise={noise}"
+                        count += 1
+                        yield description, image, expected
+
+def main():
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else 'synthetic_labels'
+    os.makedirs(out_dir, exist_ok=True)
+    for index, (description, image, _) in enumerate(label_variants()):
+        path = os.path.join(out_dir, f"label_{index:03d}.png")
+        cv2.imwrite(path, image)
+        print(f"{path}: {description}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+import atexit
+import csv
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from write_behind import WriteBehind
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends from one process are still batched, just not locked
+    fcntl = None
+
+DATASET_FOLDER = os.environ.get('DATASET_FOLDER', 'DATASET')
+# csv appends to one file per day; parquet and arrow write part files under date=YYYY-MM-DD/
+DATASET_FORMAT = os.environ.get('DATASET_FORMAT', 'csv').lower()
+DATASET_BATCH_SIZE = int(os.environ.get('DATASET_BATCH_SIZE', 200))
+DATASET_FLUSH_SECONDS = float(os.environ.get('DATASET_FLUSH_SECONDS', 10))
+# Each process keeps one part file open per day and appends every flush to it, starting a new one
+# after this many rows or seconds, so a day holds a few files per worker rather than one per flush
+DATASET_PART_ROWS = int(os.environ.get('DATASET_PART_ROWS', 10000))
+DATASET_PART_SECONDS = float(os.environ.get('DATASET_PART_SECONDS', 300))
+
+def _finalize_part(temp_path, path, file_format):
+    """Rewrite a staged Arrow stream as the final part file and remove the stream. Returns the rows kept.
+    The name of the final file follows from the stream's, so finalizing the same stream twice is harmless."""
+    import pyarrow as pa
+    batches = []
+    schema = None
+    try:
+        with pa.OSFile(temp_path, 'rb') as source:
+            reader = pa.ipc.open_stream(source)
+            schema = reader.schema
+            for batch in reader:
+                batches.append(batch)
+    except (pa.ArrowInvalid, OSError) as e:
+        # A process killed mid-write leaves a truncated last batch; every batch before it is kept
+        print(f"Dataset part {temp_path} ends early, keeping {sum(b.num_rows for b in batches)} rows: {str(e)}")
+    if batches:
+        table = pa.Table.from_batches(batches, schema)
+        staging_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+        if file_format == 'parquet':
+            import pyarrow.parquet as pq
+            pq.write_table(table, staging_path)
+        else:
+            with pa.OSFile(staging_path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+                writer.write_table(table)
+        os.replace(staging_path, path)
+    try:
+        os.remove(temp_path)
+    except FileNotFoundError:
+        pass
+    return sum(batch.num_rows for batch in batches)
+
+class _PartWriter:
+    """One open parquet or arrow part file.
+
+    Rows go to an Arrow stream under a dot-prefixed name, which pyarrow datasets skip. Every
+    write is flushed, so the stream stays readable up to its last batch if the process dies.
+    close() converts it to part-*.parquet / part-*.arrow. The stream is locked while it is open,
+    which is how recover_parts tells a live part from one left by a dead process.
+    """
+
+    def __init__(self, folder, file_format, schema):
+        import pyarrow as pa
+        self.file_format = file_format
+        extension = 'parquet' if file_format == 'parquet' else 'arrow'
+        name = f"part-{os.getpid()}-{time.time_ns()}.{extension}"
+        self.path = os.path.join(folder, name)
+        self.temp_path = os.path.join(folder, f".{name}.inprogress")
+        self.opened_at = time.time()
+        self.rows = 0
+        self._sink = open(self.temp_path, 'wb')
+        if fcntl:
+            fcntl.flock(self._sink, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._writer = pa.ipc.new_stream(self._sink, schema)
+
+    def write(self, table):
+        self._writer.write_table(table)
+        self._sink.flush()
+        self.rows += table.num_rows
+
+    def full(self):
+        return self.rows >= DATASET_PART_ROWS or time.time() - self.opened_at >= DATASET_PART_SECONDS
+
+    def close(self):
+        self._writer.close()
+        self._sink.flush()
+        try:
+            # Still locked, so recover_parts in another worker leaves it alone
+            _finalize_part(self.temp_path, self.path, self.file_format)
+        finally:
+            self._sink.close()
+
+def recover_parts(folder):
+    """Finalize part streams left open by processes that died without closing them (e.g. SIGKILL).
+    Streams still locked by a live writer are skipped. Without fcntl (Windows) nothing is recovered.
+    Returns the number of parts recovered."""
+    if fcntl is None or not os.path.isdir(folder):
+        return 0
+    recovered = 0
+    for day_folder in sorted(os.listdir(folder)):
+        if not day_folder.startswith('date='):
+            continue
+        day_path = os.path.join(folder, day_folder)
+        for name in sorted(os.listdir(day_path)):
+            if not (name.startswith('.part-') and name.endswith('.inprogress')):
+                continue
+            temp_path = os.path.join(day_path, name)
+            try:
+                stream = open(temp_path, 'rb')
+            except FileNotFoundError:
+                continue
+            with stream:
+                try:
+                    fcntl.flock(stream, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                if not os.path.exists(temp_path):
+                    # Finalized by its writer while this process waited for the lock
+                    continue
+                final_name = name[1:-len('.inprogress')]
+                file_format = 'parquet' if final_name.endswith('.parquet') else 'arrow'
+                rows = _finalize_part(temp_path, os.path.join(day_path, final_name), file_format)
+                print(f"Recovered dataset part {final_name} ({rows} rows)")
+                recovered += 1
+    return recovered
+
+class DatasetLog:
+    """Write-behind training log of scored scans, rotated by UTC day."""
+
+    def __init__(self, fieldnames, folder=DATASET_FOLDER, file_format=DATASET_FORMAT,
+                 batch_size=DATASET_BATCH_SIZE, flush_interval=DATASET_FLUSH_SECONDS):
+        self.fieldnames = list(fieldnames)
+        self.folder = folder
+        self.file_format = file_format
+        if file_format in ('parquet', 'arrow'):
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                print(f"pyarrow is not installed, writing the {file_format} dataset as csv instead")
+                self.file_format = 'csv'
+        self._writer = WriteBehind(self._write_rows, batch_size, flush_interval, name='dataset-log')
+        if self.file_format != 'csv':
+            self._recover_parts()
+        # Open part files by day, owned by the process in _parts_pid
+        self._parts = {}
+        self._parts_pid = os.getpid()
+        self._parts_lock = threading.Lock()
+        # Registered before the write-behind's own exit flush, so it runs after it
+        atexit.register(self.close)
+
+    def append(self, data):
+        """Queue one scored scan. Missing nutrients are left empty."""
+        row = {key: data.get(key) for key in self.fieldnames}
+        self._writer.put((datetime.now(timezone.utc).strftime('%Y-%m-%d'), row))
+
+    def flush(self):
+        self._writer.flush()
+
+    def close(self):
+        """Flush queued rows and close the open part files so they become readable."""
+        self._writer.flush()
+        self._close_parts(lambda day: True)
+
+    def _write_rows(self, items):
+        rows_by_day = {}
+        for day, row in items:
+            rows_by_day.setdefault(day, []).append(row)
+        for day, rows in rows_by_day.items():
+            if self.file_format == 'csv':
+                self._append_csv(day, rows)
+            else:
+                self._write_part(day, rows)
+        if self.file_format != 'csv':
+            # Rows for a day are only queued until shortly after midnight, so older parts are done
+            self._close_parts(lambda day: day not in rows_by_day)
+        print(f"Data appended to {self.folder} successfully! ({len(items)} rows)")
+
+    def _append_csv(self, day, rows):
+        os.makedirs(self.folder, exist_ok=True)
+        path = os.path.join(self.folder, f"DATASET-{day}.csv")
+        with open(path, mode='a', newline='\n', encoding='utf-8') as csvfile:
+            # Other worker processes append to the same daily file
+            if fcntl:
+                fcntl.flock(csvfile, fcntl.LOCK_EX)
+            try:
+                writer = csv.DictWriter(csvfile, fieldnames=self.fieldnames)
+                csvfile.seek(0, os.SEEK_END)
+                if csvfile.tell() == 0:
+                    writer.writeheader()
+                writer.writerows({key: "" if value is None else value for key, value in row.items()}
+                                 for row in rows)
+                csvfile.flush()
+            finally:
+                if fcntl:
+                    fcntl.flock(csvfile, fcntl.LOCK_UN)
+
+    def _write_part(self, day, rows):
+        import pyarrow as pa
+        table = pa.table({key: pa.array([row[key] for row in rows], type=pa.float64())
+                          for key in self.fieldnames})
+        with self._parts_lock:
+            parts = self._own_parts()
+            part = parts.get(day)
+            if part is None:
+                # Parts are opened every few minutes, so parts of a worker that was killed meanwhile turn up soon
+                self._recover_parts()
+                folder = os.path.join(self.folder, f"date={day}")
+                os.makedirs(folder, exist_ok=True)
+                # Part names are unique per process, so workers never write the same file
+                part = parts[day] = _PartWriter(folder, self.file_format, table.schema)
+            part.write(table)
+            if part.full():
+                del parts[day]
+                part.close()
+
+    def _own_parts(self):
+        if self._parts_pid != os.getpid():
+            # Files opened before a fork belong to the parent process
+            self._parts = {}
+            self._parts_pid = os.getpid()
+        return self._parts
+
+    def _close_parts(self, should_close):
+        with self._parts_lock:
+            parts = self._own_parts()
+            for day in [day for day in parts if should_close(day)]:
+                try:
+                    parts.pop(day).close()
+                except OSError as e:
+                    print(f"Could not close dataset part for {day}: {str(e)}")
+
+    def _recover_parts(self):
+        try:
+            recover_parts(self.folder)
+        except OSError as e:
+            print(f"Could not recover dataset parts in {self.folder}: {str(e)}")
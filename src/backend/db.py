@@ -0,0 +1,96 @@
+import os
+from dotenv import load_dotenv
+from pymongo import MongoClient, ASCENDING
+from pymongo.errors import PyMongoError
+from metrics import MongoCommandTimer
+
+load_dotenv()
+
+MONGODB_URI = os.environ.get("MONGODB_URI")
+
+# Connection pool sizing and timeouts; the defaults suit one app process with a few dozen request threads
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 50))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 2))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 60000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 10000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000))
+
+# Extracted tables are kept this long for re-scoring
+SCAN_TTL_DAYS = int(os.environ.get('SCAN_TTL_DAYS', 30))
+
+client_options = dict(
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    # Connect on first use, so a pre-forking server's master never hands an open client to its workers
+    connect=False,
+    # Feeds the mongo_command_seconds histogram on /metrics
+    event_listeners=[MongoCommandTimer()],
+)
+client = MongoClient(MONGODB_URI, **client_options)
+db = client['nutrilens']
+user_profiles_collection = db['userprofiles']
+history_collection = db['history']
+scans_collection = db['scans']
+
+_async_db = None
+
+def get_async_db():
+    """The same database through pymongo's asyncio client, for the ASGI app.
+    Created on first use so it belongs to the running event loop of this process."""
+    global _async_db
+    if _async_db is None:
+        from pymongo import AsyncMongoClient
+        _async_db = AsyncMongoClient(MONGODB_URI, **client_options)[db.name]
+    return _async_db
+
+def ensure_indexes():
+    """Create the indexes behind the hot queries. Safe to run on every start."""
+    indexes = [
+        (user_profiles_collection, [("clerkId", ASCENDING)], {"name": "clerkId_unique", "unique": True}),
+        (history_collection, [("userId", ASCENDING), ("date", ASCENDING), ("name", ASCENDING)],
+         {"name": "userId_date_name"}),
+        # Serves the history pages, which walk one user's entries in _id order
+        (history_collection, [("userId", ASCENDING), ("_id", ASCENDING)], {"name": "userId_id"}),
+        (scans_collection, [("createdAt", ASCENDING)],
+         {"name": "createdAt_ttl", "expireAfterSeconds": SCAN_TTL_DAYS * 24 * 3600}),
+    ]
+    for collection, keys, options in indexes:
+        try:
+            collection.create_index(keys, **options)
+        except PyMongoError as e:
+            # e.g. duplicate clerkIds block the unique index; keep serving and report it
+            print(f"Could not create index {options['name']} on {collection.name}: {str(e)}")
+
+def _plan_stages(plan):
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _plan_stages(value)
+
+def check_query_plans():
+    """Explain the hot queries and log any whose winning plan scans the whole collection."""
+    hot_queries = [
+        ("userprofiles.find_one by clerkId", user_profiles_collection, {"clerkId": "plan-check"}),
+        ("history.find by userId", history_collection, {"userId": "plan-check"}),
+        ("history.delete_one by userId/date/name", history_collection,
+         {"userId": "plan-check", "date": "1970-01-01", "name": "plan-check"}),
+    ]
+    for label, collection, query in hot_queries:
+        try:
+            plan = collection.find(query).explain().get('queryPlanner', {}).get('winningPlan', {})
+        except PyMongoError as e:
+            print(f"Could not explain {label}: {str(e)}")
+            continue
+        if 'COLLSCAN' in set(_plan_stages(plan)):
+            print(f"WARNING: {label} is not using an index (COLLSCAN)")
@@ -6,28 +6,273 @@
 # %%
 ##hello
 import cv2
-from paddleocr import PaddleOCR
 import numpy as np
 import csv
-import tensorflow as tf
 import re
 from rapidfuzz import process, fuzz
 import pandas as pd
+from table_geometry import non_max_suppression, assign_cells, cluster_rows, deskew_boxes
+import os
+import threading
+from metrics import timed, SCAN_STAGE_SECONDS
 
 # %%
-# Initialize PaddleOCR
-ocr = PaddleOCR(lang='en')
-
-def process_image(image_path):
-
-    # %%
-    def preprocess_image(image_path):
-        # Load image
-        image = cv2.imread(image_path)
-        
+# PaddleOCR is loaded on first use so importing this module stays cheap
+ocr = None
+
+# Local model directories, so the server and benchmarks can run offline; unset ones are downloaded by PaddleOCR
+OCR_MODEL_DIRS = {
+    'det_model_dir': os.environ.get('PADDLEOCR_DET_MODEL_DIR'),
+    'rec_model_dir': os.environ.get('PADDLEOCR_REC_MODEL_DIR'),
+    'cls_model_dir': os.environ.get('PADDLEOCR_CLS_MODEL_DIR'),
+}
+
+# Resolution handed to OCR: small labels are enlarged by up to OCR_MAX_UPSCALE and large photos
+# are shrunk so their long side is at most OCR_MAX_SIDE pixels (0 turns the cap off)
+OCR_MAX_UPSCALE = float(os.environ.get('OCR_MAX_UPSCALE', 1.5))
+OCR_MAX_SIDE = int(os.environ.get('OCR_MAX_SIDE', 1600))
+
+def ocr_scale(height, width):
+    """Resize factor for an image of this size before OCR."""
+    scale = OCR_MAX_UPSCALE
+    if OCR_MAX_SIDE > 0:
+        scale = min(scale, OCR_MAX_SIDE / max(height, width))
+    return scale
+
+# Crop to the nutrition table before OCR; the table is found from its horizontal rules on a small copy
+OCR_CROP_PANEL = os.environ.get('OCR_CROP_PANEL', '1').lower() in ('1', 'true', 'yes')
+PANEL_DETECT_SIDE = int(os.environ.get('PANEL_DETECT_SIDE', 640))
+PANEL_MIN_RULES = int(os.environ.get('PANEL_MIN_RULES', 3))
+
+def find_panel_region(image):
+    """Return (x0, y0, x1, y1) of the nutrition table in a BGR image, or None if there is no
+    clear table or it already fills most of the frame."""
+    height, width = image.shape[:2]
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    scale = min(1.0, PANEL_DETECT_SIDE / max(height, width))
+    if scale < 1:
+        gray = cv2.resize(gray, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    small_height, small_width = gray.shape
+
+    # Dark strokes on a light background, thickened vertically so slightly skewed rules stay connected
+    binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 15, 10)
+    binary = cv2.dilate(binary, cv2.getStructuringElement(cv2.MORPH_RECT, (1, 5)))
+    # Only strokes at least a tenth of the image wide survive: the table's rules
+    rule_width = max(10, small_width // 10)
+    rules_mask = cv2.morphologyEx(binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (rule_width, 1)))
+    contours, _ = cv2.findContours(rules_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    rules = sorted((cv2.boundingRect(contour) for contour in contours), key=lambda rect: rect[1])
+
+    # Group rules that are stacked above each other with overlapping x extents
+    groups = []
+    max_gap = small_height // 4
+    for x, y, w, h in rules:
+        for group in groups:
+            gx0, gy0, gx1, gy1 = group['box']
+            overlap = min(gx1, x + w) - max(gx0, x)
+            if y - gy1 <= max_gap and overlap >= 0.5 * min(gx1 - gx0, w):
+                group['box'] = [min(gx0, x), gy0, max(gx1, x + w), max(gy1, y + h)]
+                group['count'] += 1
+                break
+        else:
+            groups.append({'box': [x, y, x + w, y + h], 'count': 1})
+    groups = [group for group in groups if group['count'] >= PANEL_MIN_RULES]
+    if not groups:
+        return None
+
+    best = max(groups, key=lambda group: (group['count'], group['box'][3] - group['box'][1]))
+    x0, y0, x1, y1 = best['box']
+    # Pad by about one row so text above the first rule and below the last one is kept
+    row_pad = (y1 - y0) / max(best['count'] - 1, 1) * 1.5
+    col_pad = 0.03 * small_width
+    x0, x1 = max(0, x0 - col_pad), min(small_width, x1 + col_pad)
+    y0, y1 = max(0, y0 - row_pad), min(small_height, y1 + row_pad)
+    if (x1 - x0) * (y1 - y0) > 0.9 * small_width * small_height:
+        return None
+    return int(x0 / scale), int(y0 / scale), int(np.ceil(x1 / scale)), int(np.ceil(y1 / scale))
+
+# PaddleOCR predictors are not thread-safe, so concurrent jobs take turns on the model
+ocr_lock = threading.Lock()
+
+def load_ocr(cpu_threads=None):
+    """Load the PaddleOCR model once per process. cpu_threads caps its intra-op threads."""
+    global ocr
+    if ocr is None:
+        from paddleocr import PaddleOCR
+        options = {'lang': 'en'}
+        options.update({name: path for name, path in OCR_MODEL_DIRS.items() if path})
+        if cpu_threads:
+            options['cpu_threads'] = cpu_threads
+        ocr = PaddleOCR(**options)
+    return ocr
+
+def warm_up_ocr():
+    """Run detection and recognition once so the first real scan does not pay for it."""
+    image = np.full((64, 320, 3), 255, dtype=np.uint8)
+    cv2.putText(image, "Protein 10 g", (10, 45), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+    with ocr_lock:
+        load_ocr().ocr(image)
+
+def decode_image(image_bytes, timings=None):
+    """Decode an uploaded image straight from memory into a BGR array. The decode time is
+    added to timings when given, so it can be passed on to the scan's job."""
+    decode_timings = {}
+    with timed(decode_timings, 'decode'):
+        buffer = np.frombuffer(image_bytes, dtype=np.uint8)
+        image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+    SCAN_STAGE_SECONDS.labels(stage='decode').observe(decode_timings['decode'])
+    if timings is not None:
+        timings.update(decode_timings)
+    if image is None:
+        raise ValueError("Could not decode the uploaded image.")
+    return image
+
+def save_debug_artifacts(debug_dir, image, ocr_results, boxes, table_rows, horiz_boxes, vert_boxes, horiz_lines):
+    """Write the diagnostic images for one scan. Only called for debug or sampled requests.
+    boxes and the bands are deskewed, so on a tilted photo they are drawn level."""
+    os.makedirs(debug_dir, exist_ok=True)
+    image_cv = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+    # Highlight the OCR boxes with their probabilities
+    highlighted = image_cv.copy()
+    for line in ocr_results:
+        for i in line:
+            # Get bounding box coordinates (points)
+            box = np.array(i[0], dtype=np.int32)  # Coordinates of the box
+            probability = i[1][1]  # Probability (confidence score)
+            
+            # Draw the bounding box around the detected text with a dark color
+            points = box.reshape((-1, 1, 2))
+            cv2.polylines(highlighted, [points], isClosed=True, color=(0, 0, 255), thickness=2)  # Dark Red
+            
+            # Place the probability text near the bounding box in dark color
+            x_min = int(np.min(box[:, 0]))
+            y_min = int(np.min(box[:, 1]))
+            cv2.putText(highlighted, f'{probability:.2f}', (x_min, y_min - 10), 
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2, cv2.LINE_AA)  # Dark Red text
+    cv2.imwrite(os.path.join(debug_dir, 'highlighted_image_dark.jpg'), highlighted)
+
+    # Outline the detected table rows
+    rows_image = image_cv.copy()
+    for row in table_rows:
+        row_points = np.array([point for index in row for point in boxes[index]], dtype=np.int32)
+        x, y, w, h = cv2.boundingRect(row_points)
+        cv2.rectangle(rows_image, (x, y), (x + w, y + h), (255, 0, 0), 2)
+    cv2.imwrite(os.path.join(debug_dir, 'detected_tables.jpg'), rows_image)
+
+    # Every horizontal (red) and vertical (green) band before suppression
+    bands = image_cv.copy()
+    for horiz_box, vert_box in zip(horiz_boxes, vert_boxes):
+        cv2.rectangle(bands, tuple(horiz_box[:2]), tuple(horiz_box[2:]), (0, 0, 255), 1)
+        cv2.rectangle(bands, tuple(vert_box[:2]), tuple(vert_box[2:]), (0, 255, 0), 1)
+    cv2.imwrite(os.path.join(debug_dir, 'horiz_vert.jpg'), bands)
+
+    # The horizontal lines kept for the grid
+    im_nms = image_cv
+    for val in horiz_lines:
+        cv2.rectangle(im_nms, tuple(horiz_boxes[val][:2]), tuple(horiz_boxes[val][2:]), (0, 0, 255), thickness=3)
+    cv2.imwrite(os.path.join(debug_dir, 'im_nms.jpg'), im_nms)
+    print(f"Debug images saved to {debug_dir}")
+
+# Nutrient keys the model understands
+KNOWN_NUTRIENTS = [
+    "ENERGY",
+    "PROTEINS",
+    "TOTAL_FAT",
+    "SATURATED_FAT",
+    "TRANS_FAT",
+    "CHOLESTEROL",
+    "CARBOHYDRATES",
+    "FIBER",
+    "SUGAR",
+    "ADDED SUGARS",
+    "SODIUM",
+    "POTASSIUM",
+    "CALCIUM",
+    "IRON",
+    "MAGNESIUM",
+    "ZINC",
+    "VITAMIN_A",
+    "VITAMIN_C",
+    "VITAMIN_D",
+    "VITAMIN_E",
+    "VITAMIN_K",
+    "VITAMIN_B6",
+    "VITAMIN_B12",
+    "FOLATE",
+    "NIACIN",
+    "THIAMINE",
+    "RIBOFLAVIN",
+    "PHOSPHORUS",
+    "SELENIUM",
+    "COPPER",
+    "MANGANESE"
+]
+
+# Common label spellings, looked up before any fuzzy matching. Keys are in normalize_nutrient_name form.
+NUTRIENT_ALIASES = {
+    "ENERGY": "ENERGY", "CALORIES": "ENERGY", "CALORIE": "ENERGY",
+    "PROTEIN": "PROTEINS", "PROTEINS": "PROTEINS",
+    "FAT": "TOTAL_FAT", "TOTAL FAT": "TOTAL_FAT", "FAT TOTAL": "TOTAL_FAT", "TOTAL LIPIDS": "TOTAL_FAT",
+    "SATURATED FAT": "SATURATED_FAT", "SATURATED": "SATURATED_FAT", "SATURATES": "SATURATED_FAT",
+    "OF WHICH SATURATES": "SATURATED_FAT", "SAT FAT": "SATURATED_FAT", "SAT. FAT": "SATURATED_FAT",
+    "TRANS FAT": "TRANS_FAT", "TRANS": "TRANS_FAT",
+    "CHOLESTEROL": "CHOLESTEROL",
+    "CARBOHYDRATE": "CARBOHYDRATES", "CARBOHYDRATES": "CARBOHYDRATES", "TOTAL CARBOHYDRATE": "CARBOHYDRATES",
+    "TOTAL CARBOHYDRATES": "CARBOHYDRATES", "CARBS": "CARBOHYDRATES",
+    "FIBER": "FIBER", "FIBRE": "FIBER", "DIETARY FIBER": "FIBER", "DIETARY FIBRE": "FIBER",
+    "SUGAR": "SUGAR", "SUGARS": "SUGAR", "TOTAL SUGARS": "SUGAR", "OF WHICH SUGARS": "SUGAR",
+    "ADDED SUGARS": "ADDED SUGARS", "ADDED SUGAR": "ADDED SUGARS", "INCL. ADDED SUGARS": "ADDED SUGARS",
+    "SODIUM": "SODIUM", "POTASSIUM": "POTASSIUM", "CALCIUM": "CALCIUM", "IRON": "IRON",
+    "MAGNESIUM": "MAGNESIUM", "ZINC": "ZINC", "FOLATE": "FOLATE", "FOLIC ACID": "FOLATE",
+    "NIACIN": "NIACIN", "THIAMINE": "THIAMINE", "THIAMIN": "THIAMINE", "RIBOFLAVIN": "RIBOFLAVIN",
+    "PHOSPHORUS": "PHOSPHORUS", "SELENIUM": "SELENIUM", "COPPER": "COPPER", "MANGANESE": "MANGANESE",
+}
+for _vitamin in ("A", "C", "D", "E", "K", "B6", "B12"):
+    NUTRIENT_ALIASES[f"VITAMIN {_vitamin}"] = NUTRIENT_ALIASES[f"VIT {_vitamin}"] = f"VITAMIN_{_vitamin}"
+
+# A unit after the name ("Sodium mg", "Energy (kcal)") does not change the nutrient
+_NAME_UNIT = re.compile(r"\s*(?:\([^)]*\)|\b(?:KCAL|KJ|MG|MCG|UG|µG|G)\b\.?)\s*$")
+AMOUNT_PATTERN = r"\b(\d+(?:\.\d+)?)\s*(?:[a-zA-Z]*)\b"
+# Lowest fuzzy score accepted for a nutrient name
+NUTRIENT_MATCH_SCORE = 70
+
+def normalize_nutrient_name(name):
+    """Upper-case, single-spaced name without a trailing unit, as used for NUTRIENT_ALIASES keys."""
+    name = " ".join(name.upper().replace("_", " ").split())
+    return _NAME_UNIT.sub("", name)
+
+def match_nutrients(names):
+    """Map upper-cased row names to (KNOWN_NUTRIENTS key, score) pairs.
+    Exact aliases score 100; the rest are fuzzy-matched and keep their best key
+    whatever the score, so the caller applies the threshold."""
+    matches = []
+    for name in names:
+        alias = NUTRIENT_ALIASES.get(normalize_nutrient_name(name))
+        if alias is not None:
+            matches.append((alias, 100.0))
+        else:
+            matches.append(process.extractOne(name, KNOWN_NUTRIENTS, scorer=fuzz.partial_ratio)[:2])
+    return matches
+
+def process_image(image, debug_dir=None, stats=None):
+    """Extract the nutrient table from a BGR label image as {nutrient: amount per 100 g}.
+    If a stats dict is given it receives per-stage 'timings' (seconds), the 'ocr_boxes' count and
+    the 'panel' region OCR was cropped to (None for the full image)."""
+    timings = {}
+    if stats is not None:
+        stats['timings'] = timings
+
+    # %%
+    def preprocess_image(image):
         # Convert to grayscale
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
+        # Large photos are shrunk first, so the blur and threshold also run on fewer pixels
+        scale = ocr_scale(*gray.shape[:2])
+        if scale < 1:
+            gray = cv2.resize(gray, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        
         # Apply Gaussian Blur to reduce noise
         blurred = cv2.GaussianBlur(gray, (5, 5), 0)
         
@@ -35,28 +280,33 @@ def process_image(image_path):
         thresholded = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
                                             cv2.THRESH_BINARY, 11, 2)
         
-        # Resize image if necessary (for better OCR accuracy)
-        resized = cv2.resize(thresholded, (0, 0), fx=1.5, fy=1.5)
-
-        return resized
-
+        # Small images are enlarged for better OCR accuracy
+        if scale > 1:
+            thresholded = cv2.resize(thresholded, (0, 0), fx=scale, fy=scale)
 
+        return thresholded
 
 
-    # %%
-    # Preprocess the image before OCR
-    image = preprocess_image(image_path)
 
-    # Save the cleaned image to a new file
-    cv2.imwrite("cleaned_image.jpg", image)
 
     # %%
-    image_path="cleaned_image.jpg"
+    # Run OCR on the nutrition table only, when one can be found
+    if OCR_CROP_PANEL:
+        with timed(timings, 'detect_panel'):
+            region = find_panel_region(image)
+        if region is not None:
+            x0, y0, x1, y1 = region
+            image = image[y0:y1, x0:x1]
+        if stats is not None:
+            stats['panel'] = region
 
-    # Perform OCR on the image
-    ocr_results = ocr.ocr(image_path)
+    # Preprocess the image before OCR
+    with timed(timings, 'preprocess'):
+        image = preprocess_image(image)
 
-    print(ocr_results)
+    # Perform OCR on the image (PaddleOCR expands the grayscale channel itself)
+    with ocr_lock, timed(timings, 'ocr'):
+        ocr_results = load_ocr().ocr(image)
 
 
     # %%
@@ -70,282 +320,100 @@ def process_image(image_path):
             boxes.append(i[0])
             texts.append(i[1][0])
             probabilities.append(i[1][1])
-
-    print(boxes)
-    print(texts)
-    print(probabilities)
-
-
-    # %%
-    def highlight_boxes_with_probabilities(image_path, ocr_results):
-        # Load the image
-        image = cv2.imread(image_path)
-
-        # Loop through OCR results and highlight regions (boxes) on the image
-        for line in ocr_results:
-            for i in line:
-                # Get bounding box coordinates (points)
-                box = np.array(i[0], dtype=np.int32)  # Coordinates of the box
-                text = i[1][0]  # Extracted text
-                probability = i[1][1]  # Probability (confidence score)
-                
-                # Draw the bounding box around the detected text with a dark color
-                points = box.reshape((-1, 1, 2))
-                cv2.polylines(image, [points], isClosed=True, color=(0, 0, 255), thickness=2)  # Dark Red
-                
-                # Place the probability text near the bounding box in dark color
-                x_min = np.min(box[:, 0])
-                y_min = np.min(box[:, 1])
-                cv2.putText(image, f'{probability:.2f}', (x_min, y_min - 10), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2, cv2.LINE_AA)  # Dark Red text
-        
-        # Save or display the image with highlighted boxes and probabilities
-        output_image_path = 'highlighted_image_dark.jpg'
-        cv2.imwrite(output_image_path, image)
-        print(f"Image with highlighted boxes saved as {output_image_path}")
-
-    highlight_boxes_with_probabilities(image_path,ocr_results)
-
-    # %%
-    # Helper function to check if boxes are aligned
-    def are_boxes_aligned(box1, box2, axis="horizontal", threshold=10):
-        """Check if two boxes are aligned either horizontally or vertically."""
-        if axis == "horizontal":
-            return abs(box1[0][1] - box2[0][1]) < threshold
-        elif axis == "vertical":
-            return abs(box1[0][0] - box2[0][0]) < threshold
-
-
-    # %%
-    # Detect tables based on alignment
-    table_candidates = []
-    used_boxes = set()
-
-    # %%
-    for i, box1 in enumerate(boxes):
-        row_group = [i]  # Initialize a new group
-        for j, box2 in enumerate(boxes):
-            if j != i and are_boxes_aligned(box1, box2, axis="horizontal"):
-                row_group.append(j)
-        if len(row_group) > 1:  # Only consider groups with more than one element
-            table_candidates.append(row_group)
-            used_boxes.update(row_group)
-
-    # %%
-    print(row_group)
-
-    # %%
-    # Save the image with detected table regions
-    cv2.imwrite("detected_tables.jpg", image)
-
-    # %%
-    image_cv = cv2.imread(image_path)
-    image_height = image_cv.shape[0]
-    image_width = image_cv.shape[1]
-
-    # %%
-    im = image_cv.copy()
-
-    # %%
-    horiz_boxes = []
-    vert_boxes = []
-
-    for box in boxes:
-        x_h, x_v = 0,int(box[0][0])
-        y_h, y_v = int(box[0][1]),0
-        width_h,width_v = image_width, int(box[2][0]-box[0][0])
-        height_h,height_v = int(box[2][1]-box[0][1]),image_height
-
-        horiz_boxes.append([int(x_h),int(y_h),int(x_h+width_h),int(y_h+height_h)])
-        vert_boxes.append([int(x_v),int(y_v),int(x_v+width_v),int(y_v+height_v)])
-
-        cv2.rectangle(im,(x_h,y_h), (x_h+width_h,y_h+height_h),(0,0,255),1)
-        cv2.rectangle(im,(x_v,y_v), (x_v+width_v,y_v+height_v),(0,255,0),1)
-
+    if stats is not None:
+        stats['ocr_boxes'] = len(boxes)
 
     # %%
-    cv2.imwrite('horiz_vert.jpg',im)
+    with timed(timings, 'grid'):
+        # Rotate the boxes level first, so the axis-aligned row and column bands below fit a tilted photo
+        boxes = deskew_boxes(boxes)
 
-    # %%
-    horiz_boxes = [[int(value) for value in row] for row in horiz_boxes]
-    print(horiz_boxes)
-    print(probabilities)
+        # Cluster the OCR boxes into table rows by their top edge
+        table_rows = cluster_rows(boxes)
 
-    # %%
-    horiz_out = tf.image.non_max_suppression(
-        horiz_boxes,
-        probabilities,
-        max_output_size = 1000,
-        iou_threshold=0.1,
-        score_threshold=float('-inf'),
-        name=None
-    )
+        # %%
+        image_height = image.shape[0]
+        image_width = image.shape[1]
 
-    # %%
-    horiz_lines = np.sort(np.array(horiz_out))
-    print(horiz_lines)
+        # %%
+        horiz_boxes = []
+        vert_boxes = []
 
-    # %%
-    im_nms = image_cv.copy()
+        for box in boxes:
+            x_h, x_v = 0,int(box[0][0])
+            y_h, y_v = int(box[0][1]),0
+            width_h,width_v = image_width, int(box[2][0]-box[0][0])
+            height_h,height_v = int(box[2][1]-box[0][1]),image_height
 
-    # %%
-    for val in horiz_lines:
-        cv2.rectangle(im_nms, 
-                    (int(horiz_boxes[val][0]), int(horiz_boxes[val][1])), 
-                    (int(horiz_boxes[val][2]), int(horiz_boxes[val][3])), 
-                    (0, 0, 255),  # Color in BGR (Red in this case)
-                    thickness=3)   # Increase the thickness to 3 (or higher for thicker lines)
+            horiz_boxes.append([int(x_h),int(y_h),int(x_h+width_h),int(y_h+height_h)])
+            vert_boxes.append([int(x_v),int(y_v),int(x_v+width_v),int(y_v+height_v)])
 
-    # %%
-    vert_out = tf.image.non_max_suppression(
-        vert_boxes,
-        probabilities,
-        max_output_size = 1000,
-        iou_threshold=0.1,
-        score_threshold=float('-inf'),
-        name=None
-    )
+        # %%
+        # One horizontal line per row: the band of its most confident box
+        horiz_lines = np.array(
+            [min(row, key=lambda index: (-probabilities[index], index)) for row in table_rows],
+            dtype=np.int32
+        )
 
     # %%
-    print(vert_out)
+    with timed(timings, 'nms'):
+        vert_out = non_max_suppression(
+            vert_boxes,
+            probabilities,
+            max_output_size = 1000,
+            iou_threshold=0.1,
+            score_threshold=float('-inf')
+        )
 
     # %%
     vert_lines = np.sort(np.array(vert_out))
-    print(vert_lines)
-
-    # %%
-    cv2.imwrite('im_nms.jpg',im_nms)
 
     # %%
-    out_array = [["" for i in range(len(vert_lines))] for j in range(len(horiz_lines))]
-    print(np.array(out_array).shape)
-    print(out_array)
+    if debug_dir:
+        save_debug_artifacts(debug_dir, image, ocr_results, boxes, table_rows,
+                             horiz_boxes, vert_boxes, horiz_lines)
 
     # %%
-    unordered_boxes = []
+    with timed(timings, 'grid'):
+        unordered_boxes = []
 
-    for i in vert_lines:
-        print(vert_boxes[i])
-        unordered_boxes.append(vert_boxes[i][0])
+        for i in vert_lines:
+            unordered_boxes.append(vert_boxes[i][0])
 
-    # %%
-    ordered_boxes = np.argsort(unordered_boxes)
-    print(ordered_boxes)
-
-    # %%
-    def intersection(box_1, box_2):
-        return [box_2[0], box_1[1],box_2[2], box_1[3]]
-
-    # %%
-    def iou(box_1, box_2):
+        # %%
+        ordered_boxes = np.argsort(unordered_boxes)
 
-        x_1 = max(box_1[0], box_2[0])
-        y_1 = max(box_1[1], box_2[1])
-        x_2 = min(box_1[2], box_2[2])
-        y_2 = min(box_1[3], box_2[3])
-
-        inter = abs(max((x_2 - x_1, 0)) * max((y_2 - y_1), 0))
-        if inter == 0:
-            return 0
-
-        box_1_area = abs((box_1[2] - box_1[0]) * (box_1[3] - box_1[1]))
-        box_2_area = abs((box_2[2] - box_2[0]) * (box_2[3] - box_2[1]))
-
-        return inter / float(box_1_area + box_2_area - inter)
+        # %%
+        # Fill every (row, column) cell with the OCR text that overlaps it
+        out_array = assign_cells(
+            [horiz_boxes[i] for i in horiz_lines],
+            [vert_boxes[vert_lines[j]] for j in ordered_boxes],
+            [[box[0][0], box[0][1], box[2][0], box[2][1]] for box in boxes],
+            texts
+        )
 
     # %%
-    for i in range(len(horiz_lines)):
-        for j in range(len(vert_lines)):
-            resultant = intersection(horiz_boxes[horiz_lines[i]], vert_boxes[vert_lines[ordered_boxes[j]]] )
+    # Function to clean and process the reconstructed table
+    def clean_data(table):
+        # Keep the nutrient name and amount columns and drop empty rows
+        df = pd.DataFrame(table).reindex(columns=[0, 1]).fillna("")  # Missing columns become empty
+        df = df[(df[0] != "") | (df[1] != "")].reset_index(drop=True)
 
-            for b in range(len(boxes)):
-                the_box = [boxes[b][0][0],boxes[b][0][1],boxes[b][2][0],boxes[b][2][1]]
-                if(iou(resultant,the_box)>0.1):
-                    out_array[i][j] = texts[b]
-
-    # %%
-    out_array=np.array(out_array)
-
-    # %%
-    out_array
-
-    # %%
-
-
-    # %%
-
-
-    # %%
-    pd.DataFrame(out_array).to_csv('Final_Table.csv')
-
-    # %%
-
-
-    # Updated list of known nutrients
-    KNOWN_NUTRIENTS = [
-        "ENERGY",
-        "PROTEINS",
-        "TOTAL_FAT",
-        "SATURATED_FAT",
-        "TRANS_FAT",
-        "CHOLESTEROL",
-        "CARBOHYDRATES",
-        "FIBER",
-        "SUGAR",
-        "ADDED SUGARS",
-        "SODIUM",
-        "POTASSIUM",
-        "CALCIUM",
-        "IRON",
-        "MAGNESIUM",
-        "ZINC",
-        "VITAMIN_A",
-        "VITAMIN_C",
-        "VITAMIN_D",
-        "VITAMIN_E",
-        "VITAMIN_K",
-        "VITAMIN_B6",
-        "VITAMIN_B12",
-        "FOLATE",
-        "NIACIN",
-        "THIAMINE",
-        "RIBOFLAVIN",
-        "PHOSPHORUS",
-        "SELENIUM",
-        "COPPER",
-        "MANGANESE"
-    ]
-
-    # Function to clean and process the data
-    def clean_data(file_path, output_path):
-        # Read the CSV file, remove unwanted columns, and drop empty rows
-        df = pd.read_csv(file_path, header=None)  # Read file without assuming headers
-        columns_to_drop = [0, 3]  # Columns to drop
-        columns_to_drop = [col for col in columns_to_drop if col in df.columns]  # Only drop if present
-        df = df.drop(columns=columns_to_drop, errors="ignore").dropna(how="all").reset_index(drop=True)
+        # Clean and standardize the names, then match them all at once
+        names = df[0].astype(str).str.strip().str.upper().tolist()
+        amount_values = df[1].astype(str).str.strip()
+        matches = match_nutrients(names)
+        # First number in each amount cell, NaN when there is none
+        amounts = amount_values.str.extract(AMOUNT_PATTERN, expand=False).astype(float)
 
         # List to store cleaned data and set to track processed nutrients
         cleaned_data = []
         processed_nutrients = set()  # To avoid duplicate nutrients
 
-        # Loop through each row in the data
-        for _, row in df.iterrows():
-            # Get nutrient name and amount value
-            nutrient_name = str(row[1]).strip().upper()  # Clean and standardize nutrient name
-            amount_value = str(row[2]).strip()  # Clean amount value
-
-            # Find the closest match for the nutrient name
-            match, score, _ = process.extractOne(
-                nutrient_name, KNOWN_NUTRIENTS, scorer=fuzz.partial_ratio
-            )
-
+        for nutrient_name, amount_value, (match, score), amount in zip(names, amount_values, matches, amounts):
             # Additional specificity check: Avoid confusing similar nutrient names
-            if score > 70 and match not in processed_nutrients:  # Ensure no repetition
-                # Extract the numeric value from the amount column
-                match_amount = re.search(r"\b(\d+(?:\.\d+)?)\s*(?:[a-zA-Z]*)\b", amount_value)  # Look for numbers
-                if match_amount:
-                    amount = float(match_amount.group(1))  # Convert number to a float
-
+            if score > NUTRIENT_MATCH_SCORE and match not in processed_nutrients:  # Ensure no repetition
+                if not pd.isna(amount):
                     # Skip if amount is 0
                     if amount != 0:
                         cleaned_data.append([match, amount])  # Add the valid nutrient and amount to the list
@@ -359,13 +427,8 @@ def process_image(image_path):
             else:
                 print(f"Skipped row (no valid nutrient match): {nutrient_name}")
 
-        # Save the cleaned data to a new CSV file without column names
-        pd.DataFrame(cleaned_data).to_csv(output_path, index=False, header=False)
-        print(f"Cleaned data saved to {output_path}")
-
-    # Example usage
-    input_file = "Final_Table.csv"  # Input file path
-    output_file = "cleaned_nutrition_data.csv"  # Output file path
-    clean_data(input_file, output_file)
-
+        # Return the per-100g values keyed by nutrient
+        return dict(cleaned_data)
 
+    with timed(timings, 'clean_data'):
+        return clean_data(out_array)
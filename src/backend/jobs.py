@@ -0,0 +1,215 @@
+import itertools
+import os
+import threading
+import time
+import uuid
+from pymongo.errors import PyMongoError
+import metrics
+from model import execute_model
+from ocr_pool import ocr_pool
+from scan_cache import scan_cache, ScanFingerprint
+from scans import save_scan, record_queued_scan, get_scan
+
+JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_SECONDS', 3600))
+DEBUG_ARTIFACTS_FOLDER = os.environ.get('DEBUG_ARTIFACTS_FOLDER', './src/backend/debug_artifacts')
+# Save debug images for 1 in N scans; 0 only saves them when a request asks for it
+DEBUG_SAMPLE_RATE = int(os.environ.get('DEBUG_SAMPLE_RATE', 0))
+# Honour debug=1 on requests. Off by default, since any client could otherwise fill the disk with images
+DEBUG_REQUESTS = os.environ.get('DEBUG_REQUESTS', '').lower() in ('1', 'true', 'yes')
+
+_scan_counter = itertools.count(1)
+
+def wants_debug_artifacts(requested=False):
+    """Debug images are written when the request asks for them and DEBUG_REQUESTS allows it,
+    or when the scan is sampled."""
+    if requested and DEBUG_REQUESTS:
+        return True
+    return DEBUG_SAMPLE_RATE > 0 and next(_scan_counter) % DEBUG_SAMPLE_RATE == 0
+
+class Job:
+    """All state for one scan request, so concurrent scans never share files or globals."""
+
+    def __init__(self, user_id, choice, weight, debug=False):
+        self.job_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.choice = choice
+        self.weight = weight
+        self.debug_dir = os.path.join(DEBUG_ARTIFACTS_FOLDER, self.job_id) if debug else None
+        self.fingerprint = None
+        self.cached = False
+        self.scan_id = None
+        self.future = None
+        self.result = None
+        self.error = None
+        # The per-100g table, kept with the stored scan so it can be re-scored
+        self.table = None
+        # Seconds per pipeline stage, for Server-Timing
+        self.timings = {}
+        self.created_at = time.time()
+        self.finished_at = None
+        self._done = threading.Event()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    @property
+    def status(self):
+        if self._done.is_set():
+            return 'failed' if self.result is None else 'done'
+        if self.future is not None and self.future.running():
+            return 'running'
+        return 'queued'
+
+    def finish(self, future):
+        """Cache and score the OCR output once the worker hands it back."""
+        try:
+            nutrition_data, stats = future.result()
+        except Exception as e:
+            print(f"Job {self.job_id} failed: {str(e)}")
+            self.error = str(e)
+            self._mark_finished()
+            return
+        self.timings.update(stats.get('timings', {}))
+        metrics.record_stages(stats.get('timings', {}))
+        metrics.OCR_BOXES.inc(stats.get('ocr_boxes', 0))
+        metrics.MATCHED_NUTRIENTS.inc(len(nutrition_data))
+        if self.fingerprint is not None:
+            scan_cache.set(self.fingerprint, nutrition_data)
+        self.score(nutrition_data)
+
+    def score(self, nutrition_data):
+        """Weight- and profile-dependent scoring, run for every request even on a cache hit."""
+        try:
+            with metrics.timed(self.timings, 'execute_model'):
+                self.result = execute_model(self.choice, self.weight, nutrition_data)
+            metrics.SCAN_STAGE_SECONDS.labels(stage='execute_model').observe(self.timings['execute_model'])
+            if self.result is None:
+                self.error = "Could not extract nutrition data from the image."
+            else:
+                # Keep the table so a new weight or profile can be scored without OCR
+                self.table = dict(nutrition_data)
+                self.scan_id = self.job_id
+        except Exception as e:
+            print(f"Job {self.job_id} failed: {str(e)}")
+            self.error = str(e)
+        finally:
+            self._mark_finished()
+
+    def _mark_finished(self):
+        self.finished_at = time.time()
+        status = 'failed' if self.result is None else 'done'
+        metrics.SCANS.labels(status=status).inc()
+        # Written behind, so other workers can answer polls for this job and /rescore can find it
+        save_scan(self.job_id, self.to_record(status))
+        with self._callbacks_lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def add_done_callback(self, callback):
+        """Call callback(job) once the job has finished, right away if it already has.
+        It may run on a pool thread, so async callers should hand it to their loop."""
+        with self._callbacks_lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def to_dict(self):
+        return {
+            "jobId": self.job_id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "cached": self.cached,
+            "scanId": self.scan_id,
+        }
+
+    def to_record(self, status):
+        record = {
+            "userId": self.user_id,
+            "status": status,
+            "result": self.result,
+            "error": self.error,
+            "debugDir": self.debug_dir,
+            "cached": self.cached,
+            "choice": self.choice,
+            "weight": self.weight,
+        }
+        if self.table is not None:
+            record["table"] = self.table
+        return record
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+def _evict_expired_jobs():
+    cutoff = time.time() - JOB_TTL_SECONDS
+    with _jobs_lock:
+        expired = [job_id for job_id, job in _jobs.items() if job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del _jobs[job_id]
+
+def submit_job(user_id, choice, weight, image, debug=False, reserved=False, timings=None):
+    """Queue a new scan on the OCR pool and return its Job immediately.
+
+    Labels already in the scan cache skip OCR and are only re-scored. Debug scans
+    always run OCR so their images get drawn. Raises ocr_pool.PoolBusy when the
+    OCR queue is full. With reserved=True the scan uses a slot taken with
+    ocr_pool.reserve(), which a cache hit hands back. timings holds stages already
+    run for this scan, such as decode, and is reported with the job's own.
+    """
+    _evict_expired_jobs()
+    job = Job(user_id, choice, weight, wants_debug_artifacts(debug))
+    if timings:
+        job.timings.update(timings)
+    if scan_cache.enabled and job.debug_dir is None:
+        job.fingerprint = ScanFingerprint(image)
+        nutrition_data = scan_cache.get(job.fingerprint)
+        if nutrition_data is not None:
+            if reserved:
+                ocr_pool.release()
+            job.cached = True
+            with _jobs_lock:
+                _jobs[job.job_id] = job
+            job.score(nutrition_data)
+            return job
+    job.future = ocr_pool.submit(image, job.debug_dir, reserved)
+    with _jobs_lock:
+        _jobs[job.job_id] = job
+    job.future.add_done_callback(job.finish)
+    return job
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def track_job(job):
+    """Make a job pollable from every worker: store it as queued unless it has already finished."""
+    if job.finished_at is None:
+        try:
+            record_queued_scan(job.job_id, job.user_id)
+        except PyMongoError as e:
+            # The job still runs; until it finishes only this worker can answer polls for it
+            print(f"Could not record job {job.job_id}: {str(e)}")
+
+def job_status(job_id):
+    """The job's to_dict() from this process, or from the scans collection when another worker ran it.
+    None for unknown ids."""
+    job = get_job(job_id)
+    if job is not None:
+        return job.to_dict()
+    record = get_scan(job_id)
+    if not record or "status" not in record:
+        return None
+    return {
+        "jobId": job_id,
+        "status": record["status"],
+        "result": record.get("result"),
+        "error": record.get("error"),
+        "cached": record.get("cached", False),
+        "scanId": job_id if record["status"] == 'done' else None,
+    }
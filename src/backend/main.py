@@ -1,19 +1,18 @@
 from model import execute_model
 from image_processor import process_image 
-import os
+import sys
+import cv2
 
-image_directory = "./src/backend/uploads/captured_img.png"
-
-def main(choice, weight_of_food):
+def main(choice, weight_of_food, image, debug_dir=None):
     try:
-        if not os.path.exists(image_directory):
-            raise FileNotFoundError(f"The image file {image_directory} does not exist.")        
-        process_image(image_directory)
-        ans = execute_model(choice, weight_of_food)
+        if image is None:
+            raise ValueError("No image was provided.")
+        nutrition_data = process_image(image, debug_dir)
+        ans = execute_model(choice, weight_of_food, nutrition_data)
         return ans
     except Exception as e:
         print(f"An error occurred: {str(e)}")
         return None
 
 if __name__ == "__main__":
-    main("default_choice", "default_weight")
\ No newline at end of file
+    main(1, 100, cv2.imread(sys.argv[1]))
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""Latency histograms and counters for the scan pipeline, served as Prometheus text on /metrics.
+
+Under the pre-forking launcher PROMETHEUS_MULTIPROC_DIR is set and every worker writes its
+values to files there, which /metrics adds up, so a scrape sees the whole server whichever
+worker answers it. Without it (python app.py) metrics are kept in the process.
+OCR workers time their stages locally and send the timings back with the table, so all
+scan stages are recorded in the process that serves the request.
+"""
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import (CollectorRegistry, Counter, Histogram, REGISTRY, CONTENT_TYPE_LATEST,
+                               generate_latest, multiprocess)
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def render():
+    """All metrics in the Prometheus text exposition format, summed over the workers in multiprocess mode."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+SCAN_STAGE_SECONDS = Histogram('scan_stage_seconds', 'Time spent in each stage of a scan.', ['stage'],
+                               buckets=LATENCY_BUCKETS)
+MONGO_COMMAND_SECONDS = Histogram('mongo_command_seconds', 'Time spent in MongoDB commands.', ['command'],
+                                  buckets=LATENCY_BUCKETS)
+MONGO_COMMAND_FAILURES = Counter('mongo_command_failures_total', 'MongoDB commands that failed.', ['command'])
+OCR_BOXES = Counter('ocr_boxes_total', 'Text boxes returned by OCR.')
+MATCHED_NUTRIENTS = Counter('matched_nutrients_total', 'Nutrients matched in OCR tables.')
+SCANS = Counter('scans_total', 'Finished scans by status.', ['status'])
+
+@contextmanager
+def timed(timings, stage):
+    """Add the wall time of the block to timings[stage], in seconds."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+def record_stages(timings):
+    for stage, seconds in timings.items():
+        SCAN_STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+def server_timing(timings):
+    """Format stage timings as a Server-Timing header value."""
+    return ', '.join(f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in timings.items())
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Times every command sent by the clients it is registered with."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.labels(command=event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_SECONDS.labels(command=event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(command=event.command_name).inc()
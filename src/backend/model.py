@@ -1,6 +1,5 @@
-import csv
 import json
-import os
+from dataset_log import DatasetLog
 
 men_dict = {
     "PROTEINS": 54,
@@ -262,14 +261,12 @@ def findDict(choice):
         d_dict=hypertension_dict 
     return d_dict
 
-def csv_to_dict(csv_file):
+# Keep only the nutrients the RDA profiles know about
+def filter_known_nutrients(nutrition_data):
     data_dict = {}
-    with open(csv_file, mode='r', newline='') as file:
-        csv_reader = csv.reader(file)
-        for row in csv_reader:
-            key, value = row
-            if key.strip() in men_dict:
-                data_dict[key.strip()] = float(value.strip())
+    for key, value in nutrition_data.items():
+        if key.strip() in men_dict:
+            data_dict[key.strip()] = float(value)
     return data_dict
 
 # Convert per 100g values to RDA percentages based on Consumption
@@ -380,28 +377,6 @@ def score_liability(bad_dict):
 
     return num, den,countliab10,countrda
 
-# File to write the CSV data
-csv_file = "DATASET.csv"
-
-# Function to append dictionary to CSV file
-def append_dict_to_csv(file, data, all_keys):
-    file_exists = os.path.isfile(file)
-
-    # Open the file in append mode
-    with open(file, mode='a', newline='\n', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=all_keys)
-
-        # If file doesn't exist, write the header first
-        if not file_exists:
-            writer.writeheader()
-
-        # Fill missing keys with empty values
-        complete_data = {key: data.get(key, "") for key in all_keys}
-
-        # Write the row data
-        writer.writerow(complete_data)
-    print(f"Data appended to {file} successfully!")
-
 nutrients_dict = {
     "PROTEINS": None,
     "FIBER": None,
@@ -429,13 +404,15 @@ nutrients_dict = {
     "FINAL_RATING":None
 }
 
-# Main execution
-def execute_model(choice,weight_of_food):
+# Training log of every scored scan, written in batches off the request path
+dataset_log = DatasetLog(nutrients_dict)
+
+# Main execution; log=False scores without adding a row to the training log (e.g. re-scoring a stored scan)
+def execute_model(choice,weight_of_food,nutrition_data,log=True):
     try:
         user_dict = findDict(choice)    
-        data_dict = csv_to_dict("cleaned_nutrition_data.csv")
+        data_dict = filter_known_nutrients(nutrition_data)
         data_dict = convert_dict_to_rda(user_dict,data_dict, weight_of_food)
-        print(data_dict)
         good_dict, bad_dict = separate_dict(data_dict)
         goodx=len(good_dict)
         badx=len(bad_dict)
@@ -461,8 +438,8 @@ def execute_model(choice,weight_of_food):
         if final_rating > 10: 
             final_rating = 9.5
         data_dict["FINAL_RATING"] = final_rating
-        print(data_dict)
-        append_dict_to_csv(csv_file, data_dict, nutrients_dict)
+        if log:
+            dataset_log.append(data_dict)
         return final_rating,data_dict
     except ValueError as ve:
         print(f"ValueError occurred: {ve}")
@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, BrokenExecutor
+
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', max(1, (os.cpu_count() or 1) // 2)))
+OCR_THREADS = int(os.environ.get('OCR_THREADS', 2))
+# Batches are admitted whole, so by default the queue is deep enough for the largest batch (app.BATCH_MAX_IMAGES)
+OCR_QUEUE_SIZE = int(os.environ.get('OCR_QUEUE_SIZE', max(2 * max(OCR_WORKERS, 1),
+                                                          int(os.environ.get('BATCH_MAX_IMAGES', 20)))))
+OCR_RETRY_AFTER = int(os.environ.get('OCR_RETRY_AFTER', 5))
+# How long a batch waits for enough free slots before it is turned away
+OCR_RESERVE_TIMEOUT = float(os.environ.get('OCR_RESERVE_TIMEOUT', 30))
+
+class PoolBusy(Exception):
+    """Raised when the OCR queue is full. retry_after is a hint in seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__("OCR workers are busy, please retry later.")
+        self.retry_after = retry_after
+
+def _init_worker(threads, warmed_up):
+    # Pin the math libraries before PaddleOCR is imported so workers do not oversubscribe the cores
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    import image_processor
+    image_processor.load_ocr(cpu_threads=threads)
+    image_processor.warm_up_ocr()
+    # Counted per worker: the start-up pings can all be answered by whichever worker boots first
+    with warmed_up.get_lock():
+        warmed_up.value += 1
+
+def _ping():
+    return os.getpid()
+
+def _is_broken(executor):
+    # Set by concurrent.futures once a worker process died or an initializer failed; there is no public accessor
+    return bool(getattr(executor, '_broken', False))
+
+def _run_scan(image, debug_dir):
+    """Returns (nutrition_data, stats); stats carries the stage timings back to the serving process."""
+    from image_processor import process_image
+    stats = {}
+    nutrition_data = process_image(image, debug_dir, stats)
+    return nutrition_data, stats
+
+class OCRPool:
+    """Pre-warmed OCR workers behind a bounded queue.
+
+    With workers=0 the model runs in-process on a single background thread,
+    which is what a pre-forking server wants after loading the model once.
+    """
+
+    def __init__(self, workers=OCR_WORKERS, threads=OCR_THREADS, queue_size=OCR_QUEUE_SIZE,
+                 retry_after=OCR_RETRY_AFTER, reserve_timeout=OCR_RESERVE_TIMEOUT):
+        self.workers = workers
+        self.threads = threads
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+        self.reserve_timeout = reserve_timeout
+        # One slot per running scan plus one per scan allowed to wait
+        self.capacity = max(workers, 1) + queue_size
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        # One batch gathers slots at a time, so two batches never each hold part of what the other needs
+        self._reserve_lock = threading.Lock()
+        self._executor = None
+        self._warmups = []
+        self._warmed_up = None
+        self.restarts = 0
+        self._start_lock = threading.Lock()
+
+    def start(self, wait=False):
+        """Start and warm up the workers. Called lazily by submit() if not done up front."""
+        with self._start_lock:
+            if self._executor is None:
+                context = multiprocessing.get_context('spawn')
+                # Workers that finished loading and warming up their model
+                self._warmed_up = context.Value('i', 0)
+                if self.workers > 0:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=context,
+                        initializer=_init_worker,
+                        initargs=(self.threads, self._warmed_up),
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=1,
+                        thread_name_prefix='ocr',
+                        initializer=_init_worker,
+                        initargs=(self.threads, self._warmed_up),
+                    )
+                # Spawn every worker now so each one loads and warms up its model before traffic arrives
+                self._warmups = [self._executor.submit(_ping) for _ in range(max(self.workers, 1))]
+            executor = self._executor
+        if wait:
+            for future in self._warmups:
+                future.result()
+            while not self.ready():
+                if _is_broken(executor):
+                    raise BrokenExecutor("OCR workers failed to start")
+                time.sleep(0.1)
+        return executor
+
+    def ready(self):
+        """True once every worker has loaded and warmed up its model. A broken pool is rebuilt here,
+        so the readiness probe reports False until the replacement workers are warm."""
+        executor = self._executor
+        if executor is None:
+            return False
+        if _is_broken(executor):
+            self._restart(executor)
+            return False
+        return self._warmed_up.value >= max(self.workers, 1)
+
+    def reserve(self, count):
+        """Take count queue slots, waiting up to reserve_timeout for scans in flight to free them.
+        All or none: raises PoolBusy, holding nothing, if they do not free up in time.
+        Each reserved slot is used by a submit(..., reserved=True) or handed back with release()."""
+        if count > self.capacity:
+            raise ValueError(f"Cannot reserve {count} of {self.capacity} OCR slots")
+        deadline = time.monotonic() + self.reserve_timeout
+        taken = 0
+        if self._reserve_lock.acquire(timeout=self.reserve_timeout):
+            try:
+                while taken < count and self._slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                    taken += 1
+            finally:
+                self._reserve_lock.release()
+        if taken < count:
+            self.release(taken)
+            raise PoolBusy(self.retry_after)
+
+    def release(self, count=1):
+        for _ in range(count):
+            self._slots.release()
+
+    def submit(self, image, debug_dir=None, reserved=False):
+        """Queue a scan and return a Future of (nutrient dict, stats). Raises PoolBusy when the queue is full.
+        With reserved=True the scan uses a slot taken earlier with reserve(); it is released on failure too."""
+        if not reserved and not self._slots.acquire(blocking=False):
+            raise PoolBusy(self.retry_after)
+        try:
+            executor = self.start()
+            try:
+                future = executor.submit(_run_scan, image, debug_dir)
+            except BrokenExecutor:
+                # A worker died (e.g. out of memory); the old pool rejects all work, so replace it once
+                self._restart(executor)
+                future = self.start().submit(_run_scan, image, debug_dir)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _restart(self, executor):
+        with self._start_lock:
+            if self._executor is not executor:
+                return
+            print("OCR pool is broken, starting new workers")
+            self._executor = None
+            self._warmups = []
+            self.restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def shutdown(self):
+        with self._start_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+                self._warmups = []
+
+ocr_pool = OCRPool()
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from ttl_cache import TTLCache
+
+SCAN_CACHE_SIZE = int(os.environ.get('SCAN_CACHE_SIZE', 512))
+SCAN_CACHE_TTL = int(os.environ.get('SCAN_CACHE_TTL', 7 * 24 * 3600))
+# Optional directory that keeps cached tables across restarts and shares them between processes
+SCAN_CACHE_DIR = os.environ.get('SCAN_CACHE_DIR')
+# Max differing bits (out of 256) for two photos to count as the same label. Off (-1) by default:
+# labels that share a layout but differ in their numbers hash only a few bits apart
+SCAN_CACHE_NEAR_DISTANCE = int(os.environ.get('SCAN_CACHE_NEAR_DISTANCE', -1))
+
+def image_digest(image):
+    """Exact key: hash of the decoded pixels and their shape."""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(str(image.shape).encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+def perceptual_hash(image, hash_size=16):
+    """256-bit difference hash, stable across re-encoding, small crops and lighting changes."""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+class ScanFingerprint:
+    def __init__(self, image):
+        self.digest = image_digest(image)
+        self.phash = perceptual_hash(image)
+
+class ScanCache:
+    """Per-100g nutrient tables keyed by image, with an exact tier and a near-duplicate tier.
+
+    Entries live in an in-memory LRU with a TTL. When disk_dir is set every entry is also
+    written there as JSON, so a restart or another worker can serve exact hits.
+    """
+
+    def __init__(self, maxsize=SCAN_CACHE_SIZE, ttl=SCAN_CACHE_TTL, disk_dir=SCAN_CACHE_DIR,
+                 near_distance=SCAN_CACHE_NEAR_DISTANCE):
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.near_distance = near_distance
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._entries = TTLCache(maxsize, ttl)
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._load_from_disk()
+
+    @property
+    def enabled(self):
+        return self._entries.maxsize > 0
+
+    def get(self, fingerprint):
+        """Return a copy of the cached nutrient table for this image, or None."""
+        if not self.enabled:
+            return None
+        entry = self._entries.get(fingerprint.digest)
+        if entry is None and self.disk_dir:
+            entry = self._read_disk_entry(fingerprint.digest)
+            if entry is not None:
+                self._entries.set(fingerprint.digest, entry, ttl=entry['created'] + self.ttl - time.time())
+        if entry is not None:
+            self._count('exact_hits')
+            return dict(entry['table'])
+
+        if self.near_distance >= 0:
+            best = None
+            for _, candidate in self._entries.items():
+                distance = (candidate['phash'] ^ fingerprint.phash).bit_count()
+                if distance <= self.near_distance and (best is None or distance < best[0]):
+                    best = (distance, candidate)
+            if best is not None:
+                self._count('near_hits')
+                return dict(best[1]['table'])
+
+        self._count('misses')
+        return None
+
+    def set(self, fingerprint, table):
+        if not self.enabled or not table:
+            return
+        entry = {'phash': fingerprint.phash, 'table': dict(table), 'created': time.time()}
+        self._entries.set(fingerprint.digest, entry)
+        if self.disk_dir:
+            self._write_disk_entry(fingerprint.digest, entry)
+
+    def stats(self):
+        lookups = self.exact_hits + self.near_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self._entries.maxsize,
+            "exactHits": self.exact_hits,
+            "nearHits": self.near_hits,
+            "misses": self.misses,
+            "hitRate": round((self.exact_hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _disk_path(self, digest):
+        return os.path.join(self.disk_dir, f"{digest}.json")
+
+    def _read_disk_entry(self, digest):
+        try:
+            with open(self._disk_path(digest), encoding='utf-8') as file:
+                stored = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if stored['created'] + self.ttl < time.time():
+            self._remove_disk_entry(digest)
+            return None
+        return {'phash': int(stored['phash'], 16), 'table': stored['table'], 'created': stored['created']}
+
+    def _write_disk_entry(self, digest, entry):
+        stored = {'phash': format(entry['phash'], 'x'), 'table': entry['table'], 'created': entry['created']}
+        temp_path = f"{self._disk_path(digest)}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(stored, file)
+            os.replace(temp_path, self._disk_path(digest))
+        except OSError as e:
+            print(f"Could not write scan cache entry {digest}: {str(e)}")
+
+    def _remove_disk_entry(self, digest):
+        try:
+            os.remove(self._disk_path(digest))
+        except OSError:
+            pass
+
+    def _load_from_disk(self):
+        """Warm the memory tier with the newest unexpired entries and drop expired files."""
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith('.json'):
+                digest = name[:-len('.json')]
+                entry = self._read_disk_entry(digest)
+                if entry is not None:
+                    entries.append((entry['created'], digest, entry))
+        if not self.enabled:
+            return
+        entries.sort(key=lambda item: item[0])
+        for created, digest, entry in entries[-self._entries.maxsize:]:
+            self._entries.set(digest, entry, ttl=created + self.ttl - time.time())
+
+scan_cache = ScanCache()
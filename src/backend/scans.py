@@ -0,0 +1,68 @@
+import json
+import os
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from db import scans_collection
+from write_behind import WriteBehind
+
+# Scans are written in batches from a background thread, never on the thread that finishes OCR
+SCAN_WRITE_BATCH_SIZE = int(os.environ.get('SCAN_WRITE_BATCH_SIZE', 50))
+SCAN_WRITE_FLUSH_SECONDS = float(os.environ.get('SCAN_WRITE_FLUSH_SECONDS', 0.5))
+# Failed batches are retried once per flush interval (about 30 s of outage by default), then appended here
+SCAN_WRITE_RETRIES = int(os.environ.get('SCAN_WRITE_RETRIES', 60))
+SCAN_DEAD_LETTER_FILE = os.environ.get('SCAN_DEAD_LETTER_FILE', 'scan-dead-letter.jsonl')
+
+# Queued scans by id, so this process can serve and re-score a scan before its write has happened
+_pending = {}
+
+def dead_letter_scans(scans, error):
+    """Append scans that could not be saved to SCAN_DEAD_LETTER_FILE, one JSON object per line."""
+    try:
+        with open(SCAN_DEAD_LETTER_FILE, 'a', encoding='utf-8') as file:
+            file.write(''.join(json.dumps({"scan": scan, "error": error}, default=str) + '\n' for scan in scans))
+        print(f"scan-writer: {len(scans)} scans were not saved and went to {SCAN_DEAD_LETTER_FILE}: {error}")
+    finally:
+        for scan in scans:
+            _pending.pop(scan["_id"], None)
+
+def _write_scans(scans):
+    # Upserts, since a polled job already has a queued record from record_queued_scan, and a retried batch
+    # rewrites the same documents. Errors for the whole batch (e.g. the database is unreachable) raise and
+    # are retried by the writer, with the scans still served from _pending meanwhile
+    requests = [UpdateOne({"_id": scan["_id"]},
+                          {"$set": {key: value for key, value in scan.items() if key not in ("_id", "createdAt")},
+                           "$setOnInsert": {"createdAt": scan["createdAt"]}},
+                          upsert=True)
+                for scan in scans]
+    try:
+        scans_collection.bulk_write(requests, ordered=False)
+    except BulkWriteError as bwe:
+        # Per-scan errors would fail again, so those scans go straight to the dead-letter file
+        for error in bwe.details.get("writeErrors", []):
+            dead_letter_scans([scans[error["index"]]], error.get("errmsg"))
+    for scan in scans:
+        _pending.pop(scan["_id"], None)
+
+scan_writer = WriteBehind(_write_scans, SCAN_WRITE_BATCH_SIZE, SCAN_WRITE_FLUSH_SECONDS, name='scan-writer',
+                          max_retries=SCAN_WRITE_RETRIES, on_failure=dead_letter_scans)
+
+def record_queued_scan(scan_id, user_id):
+    """Store a submitted job as queued right away, so a poll that reaches another worker finds it.
+    Never overwrites the finished record, which a cache hit may already have queued."""
+    scans_collection.update_one({"_id": scan_id},
+                                {"$setOnInsert": {"userId": user_id, "status": "queued", "createdAt": datetime.utcnow()}},
+                                upsert=True)
+
+def save_scan(scan_id, record):
+    """Queue a finished scan: its status, result and error, plus the per-100g 'table' when OCR
+    succeeded, so it can be polled from any worker and re-scored without OCR."""
+    scan = dict(record, _id=scan_id, createdAt=datetime.utcnow())
+    _pending[scan_id] = scan
+    scan_writer.put(scan)
+
+def get_scan(scan_id):
+    scan = _pending.get(scan_id)
+    if scan is not None:
+        return scan
+    return scans_collection.find_one({"_id": scan_id})
@@ -0,0 +1,95 @@
+import numpy as np
+from model import findDict, filter_known_nutrients, men_dict, benef, liab, dict_benef, dict_liab
+
+# Column order shared by every matrix below
+NUTRIENTS = list(men_dict)
+NUTRIENT_INDEX = {name: index for index, name in enumerate(NUTRIENTS)}
+PROFILE_CHOICES = list(range(1, 10))
+
+# RDA_MATRIX[choice - 1, nutrient] is the daily value from the matching findDict profile
+RDA_MATRIX = np.array([[findDict(choice)[name] for name in NUTRIENTS] for choice in PROFILE_CHOICES],
+                      dtype=np.float64)
+IS_BENEFICIAL = np.array([name in benef for name in NUTRIENTS])
+IS_LIABILITY = np.array([name in liab for name in NUTRIENTS])
+# Critical values [first, second, weight] from dict_benef / dict_liab
+THRESHOLDS = np.array([dict_benef[name] if name in dict_benef else dict_liab[name] for name in NUTRIENTS],
+                      dtype=np.float64)
+
+def round4(values):
+    """Vectorised round(x, 4) that matches Python's round exactly.
+
+    np.round only disagrees with Python's correctly rounded round() when x * 1e4 lands
+    right next to a .5 boundary, so those few elements are redone with round().
+    """
+    values = np.array(values, dtype=np.float64, ndmin=1)
+    rounded = np.round(values, 4)
+    scaled = values * 1e4
+    near_tie = np.isfinite(scaled) & (
+        np.abs(scaled - np.floor(scaled) - 0.5) <= 1e-9 * np.maximum(1.0, np.abs(scaled)))
+    if near_tie.any():
+        rounded[near_tie] = [round(float(value), 4) for value in values[near_tie]]
+    return rounded
+
+def _running_sum(terms):
+    # Left-to-right accumulation in label order, like the += loops in model.py
+    return np.cumsum(terms, axis=-1)[..., -1] if terms.shape[-1] else np.zeros(terms.shape[:-1])
+
+def score_matrix(nutrition_data, choices=PROFILE_CHOICES, weights=(100,)):
+    """Score one label for every (profile choice, portion weight) pair in a single pass.
+
+    nutrition_data is the per-100g dict from image_processor. Returns a
+    (len(choices), len(weights)) array holding the same final_rating that
+    model.execute_model gives for each pair, with NaN where it would fail.
+    """
+    data_dict = filter_known_nutrients(nutrition_data)
+    columns = np.array([NUTRIENT_INDEX[name] for name in data_dict], dtype=np.intp)
+    values = np.array(list(data_dict.values()), dtype=np.float64)
+    choices = np.asarray(choices, dtype=np.intp)
+    weights = np.asarray(weights, dtype=np.float64)
+
+    # convert_dict_to_rda for every profile and weight: shape (profiles, weights, nutrients)
+    daily_values = RDA_MATRIX[choices - 1][:, columns]
+    rda = round4(((values[None, None, :] * weights[None, :, None]) / (100 * daily_values[:, None, :])) * 100)
+    rda = rda.reshape(len(choices), len(weights), len(columns))
+
+    good = IS_BENEFICIAL[columns]
+    bad = IS_LIABILITY[columns]
+    first, second, weight = THRESHOLDS[columns].T
+    goodx = int(good.sum())
+    badx = int(bad.sum())
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # score_beneficial: only values of at least 1% RDA count
+        counted = good & (rda >= 1)
+        good_points = np.where(rda >= first, 10.0,
+                               np.where(rda >= second, 8.0, np.maximum(2, 10 - (first / rda) * 1.5)))
+        num_good = _running_sum(np.where(counted, good_points * weight, 0.0))
+        den_good = _running_sum(np.where(counted, weight, 0.0))
+        count_rda_good = _running_sum(np.where(counted, rda, 0.0))
+
+        # score_liability: every liability nutrient counts
+        bad_points = np.where(rda <= first, 10.0,
+                              np.where(rda <= second, 8.0, np.maximum(-1, 10 - (rda / first) * 1.5)))
+        num_bad = _running_sum(np.where(bad, bad_points * weight, 0.0))
+        den_bad = _running_sum(np.where(bad, weight, 0.0))
+        count_rda_bad = _running_sum(np.where(bad, rda, 0.0))
+
+        denominator = den_good + den_bad
+        final_rating = round4((num_good + num_bad) / denominator).reshape(denominator.shape)
+        final_rating[denominator == 0] = np.nan
+
+        # The balance adjustment from execute_model, which only depends on the nutrient counts
+        if goodx == badx and goodx >= 4:
+            badx += 1
+        if goodx > badx:
+            update = round4(((count_rda_good * goodx) - (count_rda_bad * badx)) / ((goodx * 100) - (badx * 100)))
+            final_rating = final_rating + update.reshape(final_rating.shape)
+        elif goodx < badx:
+            update = round4(((count_rda_bad * badx) - (count_rda_good * goodx)) / ((goodx * 100) - (badx * 100)))
+            final_rating = final_rating + np.maximum(update.reshape(final_rating.shape), -3)
+        else:
+            boost = final_rating < 8.5
+            final_rating = np.where(boost, final_rating + count_rda_good / count_rda_bad, final_rating)
+            final_rating[boost & (count_rda_bad == 0)] = np.nan
+
+    return np.where(final_rating > 10, 9.5, final_rating)
@@ -1,32 +1,151 @@
-import asyncio
+"""Production launcher: a pre-forking gunicorn server in front of the backend.
+
+The master loads the OCR model once before forking, so the workers share its read-only
+pages copy-on-write, and each worker warms the model up before it accepts requests.
+Send SIGHUP to the master for a graceful restart of the workers. Workers keep their metrics
+in PROMETHEUS_MULTIPROC_DIR (a fresh temporary directory unless set), so /metrics covers all of them.
+
+    python start_server.py            # serve on $PORT (default 5001)
+    python start_server.py --probe    # exit 0 once the server answers /ready, 1 after $READY_TIMEOUT seconds
+"""
+import os
+import sys
 import socket
+import tempfile
+import threading
+import time
+import urllib.request
+import urllib.error
+
+# Each gunicorn worker runs OCR in-process on the model loaded before the fork
+os.environ.setdefault('OCR_WORKERS', '0')
+
+from gunicorn.app.base import BaseApplication
+
+PORT = int(os.environ.get('PORT', 5001))
+# wsgi serves app.py on threaded workers; asgi serves asgi.py on uvicorn workers (pip install uvicorn-worker)
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', max(1, (os.cpu_count() or 1) // 2)))
+WEB_THREADS = int(os.environ.get('WEB_THREADS', 4))
+# A scan can take 5-10 s, so workers get a generous timeout and time to finish on restart
+WORKER_TIMEOUT = int(os.environ.get('WORKER_TIMEOUT', 120))
+GRACEFUL_TIMEOUT = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+MAX_REQUESTS = int(os.environ.get('MAX_REQUESTS', 0))
+READY_TIMEOUT = int(os.environ.get('READY_TIMEOUT', 300))
 
-async def is_server_running():
-    """Check if the server is running by attempting to connect to the port."""
-    loop = asyncio.get_event_loop()
+def is_server_running(port=PORT):
+    """Check if something is already listening on the port."""
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-        sock.setblocking(False)
-        try:
-            await loop.sock_connect(sock, ('127.0.0.1', 5000))
-            return True
-        except (ConnectionRefusedError, OSError):
+        sock.settimeout(1)
+        return sock.connect_ex(('127.0.0.1', port)) == 0
+
+def is_ready(port=PORT):
+    """True when a worker answers /ready, i.e. its model is loaded and warm."""
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/ready', timeout=2) as response:
+            return response.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+def wait_until_ready(timeout=READY_TIMEOUT):
+    """Poll /ready once a second until a worker answers it or timeout seconds pass. Returns whether one did."""
+    deadline = time.time() + timeout
+    while not is_ready():
+        if time.time() >= deadline:
             return False
+        time.sleep(1)
+    return True
 
-async def start_server():
-    """Start the server if it's not already running."""
-    if not await is_server_running():
-        print("Starting server...")
-        process = await asyncio.create_subprocess_exec(
-            "python", "app.py",
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        print("Server started")
-        stdout, stderr = await process.communicate()
-        print(stdout.decode() if stdout else "No stdout")
-        print(stderr.decode() if stderr else "No stderr")
+def prepare_metrics_dir():
+    """Point prometheus_client at a directory the workers share. Must run before metrics is imported.
+    Files left by an earlier run would be added to this one's, so they are removed."""
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if not path:
+        os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='backend-metrics-')
+        return
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith('.db'):
+            os.remove(os.path.join(path, name))
+
+def preload_ocr():
+    """Load the model in the master. Warm-up inference runs in each worker, after the fork."""
+    from ocr_pool import OCR_THREADS
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ.setdefault(var, str(OCR_THREADS))
+    import image_processor
+    image_processor.load_ocr(cpu_threads=OCR_THREADS)
+
+def post_worker_init(worker):
+    from ocr_pool import ocr_pool
+    ocr_pool.start(wait=True)
+    # One worker is enough to check the indexes; the asgi app does it itself when it starts serving
+    if worker.age == 1 and SERVER_MODE != 'asgi':
+        from db import ensure_indexes, check_query_plans
+        ensure_indexes()
+        check_query_plans()
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+def when_ready(server):
+    def wait_for_workers():
+        if wait_until_ready():
+            server.log.info("Server ready on port %s", PORT)
+        else:
+            server.log.warning("Workers not ready after %s seconds", READY_TIMEOUT)
+
+    threading.Thread(target=wait_for_workers, name='readiness-probe', daemon=True).start()
+
+class Server(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # With preload_app this runs once in the master before any worker is forked
+        preload_ocr()
+        if SERVER_MODE == 'asgi':
+            from asgi import application
+            return application
+        from app import app
+        return app
+
+def server_options():
+    options = {
+        'bind': f'0.0.0.0:{PORT}',
+        'workers': WEB_WORKERS,
+        'preload_app': True,
+        'timeout': WORKER_TIMEOUT,
+        'graceful_timeout': GRACEFUL_TIMEOUT,
+        'max_requests': MAX_REQUESTS,
+        'max_requests_jitter': MAX_REQUESTS // 10,
+        'post_worker_init': post_worker_init,
+        'child_exit': child_exit,
+        'when_ready': when_ready,
+    }
+    if SERVER_MODE == 'asgi':
+        options['worker_class'] = 'uvicorn_worker.UvicornWorker'
     else:
-        print("Server already running")
+        options['worker_class'] = 'gthread'
+        options['threads'] = WEB_THREADS
+    return options
+
+def start_server():
+    """Start the server if it's not already running."""
+    if is_server_running():
+        print(f"Server already running on port {PORT}")
+        return
+    prepare_metrics_dir()
+    print(f"Starting server on port {PORT} with {WEB_WORKERS} {SERVER_MODE} workers...")
+    Server(server_options()).run()
 
 if __name__ == "__main__":
-    asyncio.run(start_server())
+    if '--probe' in sys.argv[1:]:
+        sys.exit(0 if wait_until_ready() else 1)
+    start_server()
@@ -0,0 +1,124 @@
+import numpy as np
+
+def non_max_suppression(boxes, scores, max_output_size, iou_threshold=0.1, score_threshold=float('-inf')):
+    """NumPy port of tf.image.non_max_suppression.
+
+    Boxes are any two opposite corners, scores pick the order (ties keep the lower index),
+    and a box is dropped when its IoU with an already selected box is above iou_threshold.
+    Returns the selected indices in selection order, like TensorFlow.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+
+    # Normalise corners the same way TensorFlow does, so box orientation does not matter
+    x1 = np.minimum(boxes[:, 0], boxes[:, 2])
+    y1 = np.minimum(boxes[:, 1], boxes[:, 3])
+    x2 = np.maximum(boxes[:, 0], boxes[:, 2])
+    y2 = np.maximum(boxes[:, 1], boxes[:, 3])
+    areas = (x2 - x1) * (y2 - y1)
+
+    candidates = np.flatnonzero(scores > score_threshold)
+    order = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+    selected = []
+    while order.size > 0 and len(selected) < max_output_size:
+        current = order[0]
+        selected.append(current)
+        rest = order[1:]
+
+        inter_w = np.maximum(np.minimum(x2[current], x2[rest]) - np.maximum(x1[current], x1[rest]), 0)
+        inter_h = np.maximum(np.minimum(y2[current], y2[rest]) - np.maximum(y1[current], y1[rest]), 0)
+        inter = inter_w * inter_h
+        union = areas[current] + areas[rest] - inter
+        valid = (areas[current] > 0) & (areas[rest] > 0)
+        iou = np.where(valid, inter / np.where(valid, union, 1), 0)
+
+        order = rest[iou <= iou_threshold]
+
+    return np.array(selected, dtype=np.int32)
+
+def assign_cells(row_boxes, col_boxes, text_boxes, texts, iou_threshold=0.1):
+    """Fill the table grid from OCR boxes with one batched IoU computation.
+
+    Each cell is the crossing of a row band [x0, y0, x1, y1] with a column band.
+    A text box lands in a cell when their IoU is above iou_threshold; when several
+    boxes qualify the last one wins, as in the original per-cell loop.
+    Returns a (rows, cols) array of strings.
+    """
+    rows = np.asarray(row_boxes, dtype=np.float64).reshape(-1, 4)
+    cols = np.asarray(col_boxes, dtype=np.float64).reshape(-1, 4)
+    text = np.asarray(text_boxes, dtype=np.float64).reshape(-1, 4)
+    if len(rows) == 0 or len(cols) == 0 or len(text) == 0:
+        return np.full((len(rows), len(cols)), "")
+
+    # Overlap along x depends only on (column, box) and along y only on (row, box)
+    inter_w = np.maximum(
+        np.minimum(cols[:, None, 2], text[None, :, 2]) - np.maximum(cols[:, None, 0], text[None, :, 0]), 0)
+    inter_h = np.maximum(
+        np.minimum(rows[:, None, 3], text[None, :, 3]) - np.maximum(rows[:, None, 1], text[None, :, 1]), 0)
+    inter = np.abs(inter_w[None, :, :] * inter_h[:, None, :])
+
+    cell_area = np.abs((cols[None, :, 2] - cols[None, :, 0]) * (rows[:, None, 3] - rows[:, None, 1]))
+    text_area = np.abs((text[:, 2] - text[:, 0]) * (text[:, 3] - text[:, 1]))
+    union = cell_area[:, :, None] + text_area[None, None, :] - inter
+    with np.errstate(divide='ignore', invalid='ignore'):
+        iou = np.where(inter == 0, 0, inter / union)
+
+    matched = iou > iou_threshold
+    # Index of the last matching box per cell
+    last = matched.shape[2] - 1 - np.argmax(matched[:, :, ::-1], axis=2)
+    return np.where(matched.any(axis=2), np.asarray(texts)[last], "")
+
+def text_slope(boxes):
+    """Median slope (dy/dx) of the top edges of PaddleOCR 4-point boxes: how far the photo is rotated."""
+    points = np.asarray(boxes, dtype=np.float64).reshape(-1, 4, 2)
+    edge_width = points[:, 1, 0] - points[:, 0, 0]
+    sloped = edge_width > 0
+    if not sloped.any():
+        return 0.0
+    return float(np.median((points[sloped, 1, 1] - points[sloped, 0, 1]) / edge_width[sloped]))
+
+def deskew_boxes(boxes, slope=None):
+    """Rotate 4-point boxes so their text runs horizontally.
+
+    slope defaults to text_slope(boxes). Row and column bands built from the result
+    are axis-aligned in the same frame as the boxes, so a slightly rotated photo still
+    puts every amount in the row of its name. The rotated boxes keep the top-left corner
+    of their bounding box, which keeps them inside the image. Returns an (n, 4, 2) float array.
+    """
+    points = np.asarray(boxes, dtype=np.float64).reshape(-1, 4, 2)
+    if len(points) == 0:
+        return points
+    if slope is None:
+        slope = text_slope(points)
+    angle = np.arctan(slope)
+    x, y = points[..., 0], points[..., 1]
+    rotated = np.stack([x * np.cos(angle) + y * np.sin(angle), y * np.cos(angle) - x * np.sin(angle)], axis=-1)
+    return rotated + (points.min(axis=(0, 1)) - rotated.min(axis=(0, 1)))
+
+def cluster_rows(boxes, tolerance=None):
+    """Group OCR boxes into table rows with one sort and a single sweep.
+
+    Boxes are PaddleOCR 4-point boxes. A box joins the current row while its top edge
+    is within tolerance of the top of the row's first box; tolerance defaults to half
+    the median box height so it follows the image scale. Tops are measured across the
+    text direction (see text_slope), so a slightly rotated photo does not split its rows.
+    Returns lists of box indices, rows ordered top to bottom and boxes within a row
+    left to right.
+    """
+    if len(boxes) == 0:
+        return []
+    points = np.asarray(boxes, dtype=np.float64).reshape(-1, 4, 2)
+    lefts = points[:, 0, 0]
+    tops = points[:, 0, 1] - text_slope(points) * lefts
+    if tolerance is None:
+        tolerance = 0.5 * np.median(np.abs(points[:, 2, 1] - points[:, 1, 1]))
+
+    rows = []
+    row_top = None
+    for index in np.argsort(tops, kind='stable'):
+        if row_top is None or tops[index] - row_top >= tolerance:
+            rows.append([])
+            row_top = tops[index]
+        rows[-1].append(int(index))
+    return [sorted(row, key=lambda i: lefts[i]) for row in rows]
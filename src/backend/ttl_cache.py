@@ -0,0 +1,89 @@
+import multiprocessing
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ttl seconds, with hit/miss counters."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] < time.time():
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self):
+        """Snapshot of the live (key, value) pairs, most recently used last."""
+        now = time.time()
+        with self._lock:
+            return [(key, value) for key, (value, expires_at) in self._data.items() if expires_at >= now]
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+class VersionTable:
+    """Per-key version counters in shared memory, for invalidating per-process caches.
+
+    Keys hash into a fixed number of slots; a cache entry stores the version of its slot
+    when it was filled and is stale once the slot has been bumped. The table must be created
+    before a pre-forking server forks its workers, so that they all share it. Keys that share
+    a slot only cost each other a cache miss.
+    """
+
+    def __init__(self, slots=4096):
+        self._versions = multiprocessing.RawArray('Q', slots)
+
+    def _slot(self, key):
+        # crc32 rather than hash(), which is salted differently in spawned processes
+        return zlib.crc32(str(key).encode()) % len(self._versions)
+
+    def get(self, key):
+        return self._versions[self._slot(key)]
+
+    def bump(self, key):
+        self._versions[self._slot(key)] += 1
@@ -0,0 +1,100 @@
+import atexit
+import os
+import queue
+import threading
+
+class WriteBehind:
+    """Collect items in memory and hand them to flush(items) in batches from a background thread.
+
+    Queued items are flushed as soon as batch_size of them are waiting, or every
+    flush_interval seconds otherwise, and whatever is left is flushed at interpreter exit.
+    The thread starts on first use, so objects created before a server forks its
+    workers still work in each worker.
+
+    When flush raises, its items go back in front of the queue and are retried with the
+    next batch, up to max_retries failed flushes in a row. After that, or when the exit
+    flush fails, they are passed to on_failure(items, error) if given, and dropped otherwise.
+    """
+
+    def __init__(self, flush, batch_size=100, flush_interval=5.0, name='write-behind', max_retries=0,
+                 on_failure=None):
+        self._flush = flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.name = name
+        self.max_retries = max_retries
+        self.on_failure = on_failure
+        self.flushed = 0
+        self.failed = 0
+        self._retry = []
+        self._attempts = 0
+        self._queue = queue.Queue()
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def put(self, item):
+        self._ensure_started()
+        self._queue.put(item)
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write everything queued so far from the calling thread."""
+        self._write(self._drain(), final=True)
+
+    def pending(self):
+        return self._queue.qsize() + len(self._retry)
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # Anything inherited across a fork belongs to the parent process
+                self._queue = queue.Queue()
+                self._retry = []
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name=self.name, daemon=True).start()
+                atexit.register(self.flush)
+
+    def _drain(self):
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                return items
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._write(self._drain())
+
+    def _write(self, items, final=False):
+        # Held for the whole write so the exit-time flush waits for an in-flight batch
+        with self._flush_lock:
+            items, self._retry = self._retry + items, []
+            if not items:
+                return
+            try:
+                self._flush(items)
+                self.flushed += len(items)
+                self._attempts = 0
+            except Exception as e:
+                if not final and self._attempts < self.max_retries:
+                    self._attempts += 1
+                    self._retry = items
+                    print(f"{self.name}: could not flush {len(items)} items, retry {self._attempts} "
+                          f"of {self.max_retries}: {str(e)}")
+                    return
+                self._attempts = 0
+                self.failed += len(items)
+                print(f"{self.name}: could not flush {len(items)} items: {str(e)}")
+                if self.on_failure is not None:
+                    try:
+                        self.on_failure(items, str(e))
+                    except Exception as failure_error:
+                        print(f"{self.name}: could not hand off {len(items)} failed items: {str(failure_error)}")
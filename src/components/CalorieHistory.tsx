@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react';
 import { useUser } from '@clerk/clerk-react';
 
 interface Entry {
+  _id?: string;
   date: string;
   name: string;
   final_rating: number;
@@ -110,6 +111,7 @@ const CalorieHistory = () => {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           userId: user?.id,
+          id: entry._id,
           entryId: `${entry.date} ${entry.name}`
         })
       });
@@ -117,7 +119,9 @@ const CalorieHistory = () => {
       if (!response.ok) {
         throw new Error(`Failed to delete entry. Status: ${response.statusText}`);
       }
-      setEntries(prevEntries => prevEntries.filter(e => e.date !== entry.date && e.name !== entry.name));
+      setEntries(prevEntries => prevEntries.filter(e =>
+        entry._id ? e._id !== entry._id : (e.date !== entry.date || e.name !== entry.name)
+      ));
   
       // Optionally, you can also refresh the entire history
       // fetchHistory(); // Call this function if you've defined it elsewhere